@@ -61,6 +61,7 @@ class AppConfig:
     TERMINAL_SYSTEM_COMMANDS = True
     TERMINAL_PIP_INTEGRATION = True
     TERMINAL_HISTORY_SIZE = 1000
+    TERMINAL_MAX_LINES = 5000  # Líneas conservadas en la salida; las más antiguas se descartan
     TERMINAL_AUTO_SCROLL = True
     TERMINAL_FONT_FAMILY = "Consolas"
     TERMINAL_FONT_SIZE = 11
@@ -74,6 +75,7 @@ class AppConfig:
     SESSION_REMEMBER_THEME = True
     SESSION_FILE_PATH = ".editor_session.json"
     SESSION_MAX_RECENT_FILES = 10
+    EDITOR_MMAP_THRESHOLD = 1024 * 1024  # A partir de este tamaño los archivos se leen con mmap
     
     # Configuración de formatter automático
     FORMATTER_ENABLED = True
@@ -102,6 +104,10 @@ class AppConfig:
     SEARCH_MULTI_FILE_ENABLED = True
     SEARCH_FILE_PATTERNS = ["*.py", "*.txt", "*.md", "*.json", "*.yaml", "*.yml"]
     SEARCH_EXCLUDE_PATTERNS = ["*.pyc", "__pycache__", ".git", ".venv", "node_modules"]
+    SEARCH_SKIP_BINARY_FILES = True  # Omitir archivos binarios en la búsqueda múltiple
+    SEARCH_MAX_FILE_SIZE = 10 * 1024 * 1024  # Tamaño máximo (bytes) de archivo a examinar
+    SEARCH_MMAP_THRESHOLD = 1024 * 1024  # A partir de este tamaño se busca sobre mmap
+    SEARCH_USE_RE2 = True  # Usar RE2 (si está instalado) en la búsqueda múltiple
     
     # Definición de temas predefinidos
     THEMES = {
@@ -9,6 +9,7 @@ from PySide6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QTextEdit,
                                QLineEdit, QPushButton, QLabel, QComboBox, QInputDialog)
 from PySide6.QtCore import Qt, QProcess, QProcessEnvironment, QTimer
 from PySide6.QtGui import QFont, QColor
+from config import AppConfig
 
 class IntegratedTerminalNew(QWidget):
     """Terminal integrado real del sistema usando QProcess"""
@@ -93,6 +94,8 @@ class IntegratedTerminalNew(QWidget):
         self.terminal_output = QTextEdit()
         self.terminal_output.setReadOnly(True)
         self.terminal_output.setFont(QFont("Consolas", 11))
+        # Limitar la salida acumulada: Qt descarta solo las líneas más antiguas
+        self.terminal_output.document().setMaximumBlockCount(AppConfig.TERMINAL_MAX_LINES)
         self.terminal_output.setStyleSheet("""
             QTextEdit {
                 background-color: #0C0C0C;
@@ -3,13 +3,26 @@ Vista: Interfaz gráfica del editor de código Python usando PySide6
 """
 import sys
 import os
+import io
+import mmap
 import shutil
+import tempfile
+import stat
 import keyword
 import builtins
+import copy
 import ast
+import logging
 import re
 import fnmatch
+import bisect
+import functools
+import hashlib
+import time
 from pathlib import Path
+from array import array
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 
 # Importar el nuevo terminal
 from new_terminal import IntegratedTerminalNew
@@ -21,8 +34,8 @@ from PySide6.QtWidgets import (QApplication, QMainWindow, QVBoxLayout, QHBoxLayo
                                QSystemTrayIcon, QMenu, QListWidget, QListWidgetItem, QTreeWidget,
                                QTreeWidgetItem, QInputDialog, QAbstractItemView, QTabBar, QToolTip,
                                QLineEdit, QCheckBox, QScrollArea)
-from PySide6.QtCore import Qt, QTimer, QUrl, QRect, QSettings, QPoint, QThread, Signal, QProcess
-from PySide6.QtGui import QFont, QTextCharFormat, QColor, QSyntaxHighlighter, QTextDocument, QAction, QPixmap, QDesktopServices, QPainter, QFontDatabase, QIcon, QKeyEvent, QTextCursor
+from PySide6.QtCore import Qt, QTimer, QUrl, QRect, QSettings, QPoint, QThread, Signal, QProcess, QEvent, QFileSystemWatcher, QMutex, QMutexLocker
+from PySide6.QtGui import QFont, QTextCharFormat, QColor, QSyntaxHighlighter, QTextDocument, QAction, QPixmap, QDesktopServices, QPainter, QFontDatabase, QIcon, QKeyEvent, QTextCursor, QShortcut, QKeySequence, QBrush
 from pygments import highlight
 from pygments.lexers import PythonLexer
 from pygments.formatters import NullFormatter
@@ -30,6 +43,20 @@ from pygments.token import Token
 from config import AppConfig
 from .documentation_dialog import DocumentationDialog
 
+log = logging.getLogger(__name__)
+
+# Motor de expresiones regulares RE2 (opcional, tiempo lineal garantizado)
+try:
+    import re2
+except ImportError:
+    re2 = None
+
+# Codificador JSON nativo (opcional, acelera guardar y restaurar la sesión)
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 
 class CustomSyntaxError:
     """Clase para representar un error de sintaxis"""
@@ -46,26 +73,58 @@ class SyntaxChecker(QThread):
     
     errors_found = Signal(list)  # Señal que emite la lista de errores encontrados
     
+    RESULTS_CACHE_SIZE = 32  # Resultados recordados por hash del código
+    
     def __init__(self):
         super().__init__()
         self.code_to_check = ""
+        self.code_hash = None
         self.should_check = False
+        self._mutex = QMutex()  # Protege el código pendiente entre la interfaz y el hilo
+        self._current_code = ""  # Código que se está analizando ahora
+        self._results_cache = OrderedDict()  # hash SHA-256 -> errores encontrados
         
-    def set_code(self, code):
+    def set_code(self, code, code_hash=None):
         """Establece el código a verificar"""
-        self.code_to_check = code
-        self.should_check = True
+        with QMutexLocker(self._mutex):
+            self.code_to_check = code
+            self.code_hash = code_hash
+            self.should_check = True
         
     def run(self):
-        """Ejecuta la verificación de sintaxis"""
-        if not self.should_check:
-            return
-            
+        """Ejecuta la verificación de sintaxis, repitiendo mientras llegue código nuevo"""
+        while True:
+            with QMutexLocker(self._mutex):
+                if not self.should_check:
+                    return
+                self.should_check = False
+                code, code_hash = self.code_to_check, self.code_hash
+            
+            cached = self._results_cache.get(code_hash) if code_hash is not None else None
+            if cached is not None:
+                self._results_cache.move_to_end(code_hash)
+                errors = cached
+            else:
+                self._current_code = code
+                errors = self._check_code()
+                if code_hash is not None:
+                    self._results_cache[code_hash] = errors
+                    while len(self._results_cache) > self.RESULTS_CACHE_SIZE:
+                        self._results_cache.popitem(last=False)
+            
+            # Si llegó código más reciente, sus resultados sustituyen a estos
+            with QMutexLocker(self._mutex):
+                superseded = self.should_check
+            if not superseded:
+                self.errors_found.emit(list(errors))
+    
+    def _check_code(self):
+        """Analiza el código actual y devuelve la lista de errores"""
         errors = []
         
         try:
             # Verificar sintaxis básica con AST
-            ast.parse(self.code_to_check)
+            ast.parse(self._current_code)
         except SyntaxError as e:
             errors.append(CustomSyntaxError(
                 line_number=e.lineno or 1,
@@ -107,9 +166,7 @@ class SyntaxChecker(QThread):
         # Verificar problemas comunes
         common_issues = self._find_common_issues()
         errors.extend(common_issues)
-        
-        self.errors_found.emit(errors)
-        self.should_check = False
+        return errors
     
     def _get_syntax_suggestion(self, error_msg):
         """Genera sugerencias para errores de sintaxis comunes"""
@@ -135,7 +192,7 @@ class SyntaxChecker(QThread):
         unused_vars = []
         
         try:
-            tree = ast.parse(self.code_to_check)
+            tree = ast.parse(self._current_code)
             
             # Encontrar todas las asignaciones de variables
             assignments = {}
@@ -179,7 +236,7 @@ class SyntaxChecker(QThread):
         unused_imports = []
         
         try:
-            tree = ast.parse(self.code_to_check)
+            tree = ast.parse(self._current_code)
             
             imports = {}
             usages = set()
@@ -222,7 +279,7 @@ class SyntaxChecker(QThread):
     def _find_common_issues(self):
         """Encuentra problemas comunes en el código"""
         issues = []
-        lines = self.code_to_check.split('\n')
+        lines = self._current_code.split('\n')
         
         for i, line in enumerate(lines):
             line_num = i + 1
@@ -485,7 +542,9 @@ class SearchReplaceDialog(QDialog):
         super().__init__(parent)
         self.parent_editor = parent
         self.search_mode = search_mode  # "find" o "replace"
-        self.current_matches = []
+        # Coincidencias como dos arrays paralelos de enteros (inicio, fin)
+        self.current_starts = array('i')
+        self.current_ends = array('i')
         self.current_match_index = -1
         
         self.setWindowTitle("Buscar y Reemplazar" if search_mode == "replace" else "Buscar")
@@ -629,7 +688,7 @@ class SearchReplaceDialog(QDialog):
             return
             
         document_text = editor.toPlainText()
-        self.current_matches = []
+        self._reset_matches()
         
         try:
             # Configurar opciones de búsqueda
@@ -648,11 +707,12 @@ class SearchReplaceDialog(QDialog):
             
             # Buscar todas las coincidencias
             for match in re.finditer(pattern, document_text, flags):
-                self.current_matches.append((match.start(), match.end()))
+                self.current_starts.append(match.start())
+                self.current_ends.append(match.end())
             
             # Actualizar resultados
-            if self.current_matches:
-                self.results_label.setText(f"Encontradas {len(self.current_matches)} coincidencias")
+            if self.current_starts:
+                self.results_label.setText(f"Encontradas {len(self.current_starts)} coincidencias")
                 self.current_match_index = 0
                 self._highlight_current_match()
             else:
@@ -661,39 +721,40 @@ class SearchReplaceDialog(QDialog):
                 
         except re.error as e:
             self.results_label.setText(f"Error en expresión regular: {str(e)}")
-            self.current_matches = []
+            self._reset_matches()
             self.current_match_index = -1
     
     def _find_next(self):
         """Buscar siguiente coincidencia"""
-        if not self.current_matches:
+        if not self.current_starts:
             return
             
-        self.current_match_index = (self.current_match_index + 1) % len(self.current_matches)
+        self.current_match_index = (self.current_match_index + 1) % len(self.current_starts)
         self._highlight_current_match()
         self._update_results_label()
     
     def _find_previous(self):
         """Buscar coincidencia anterior"""
-        if not self.current_matches:
+        if not self.current_starts:
             return
             
-        self.current_match_index = (self.current_match_index - 1) % len(self.current_matches)
+        self.current_match_index = (self.current_match_index - 1) % len(self.current_starts)
         self._highlight_current_match()
         self._update_results_label()
     
     def _highlight_current_match(self):
         """Resaltar la coincidencia actual"""
-        if (not self.current_matches or 
+        if (not self.current_starts or 
             self.current_match_index < 0 or 
-            self.current_match_index >= len(self.current_matches)):
+            self.current_match_index >= len(self.current_starts)):
             return
             
         editor = self.parent_editor.input_text
         if not editor:
             return
             
-        start, end = self.current_matches[self.current_match_index]
+        start = self.current_starts[self.current_match_index]
+        end = self.current_ends[self.current_match_index]
         
         # Mover cursor a la coincidencia
         cursor = editor.textCursor()
@@ -708,16 +769,16 @@ class SearchReplaceDialog(QDialog):
         """Resaltar todas las coincidencias"""
         # Esta funcionalidad se puede implementar usando QTextCharFormat
         # Por simplicidad, mostraremos un mensaje
-        if self.current_matches:
+        if self.current_starts:
             QMessageBox.information(self, "Resaltar Todo", 
-                                  f"Se encontraron {len(self.current_matches)} coincidencias.\n"
+                                  f"Se encontraron {len(self.current_starts)} coincidencias.\n"
                                   "Use 'Siguiente/Anterior' para navegar entre ellas.")
     
     def _replace_current(self):
         """Reemplazar la coincidencia actual"""
-        if (not self.current_matches or 
+        if (not self.current_starts or 
             self.current_match_index < 0 or 
-            self.current_match_index >= len(self.current_matches)):
+            self.current_match_index >= len(self.current_starts)):
             return
             
         editor = self.parent_editor.input_text
@@ -725,7 +786,8 @@ class SearchReplaceDialog(QDialog):
             return
             
         replace_text = self.replace_input.text()
-        start, end = self.current_matches[self.current_match_index]
+        start = self.current_starts[self.current_match_index]
+        end = self.current_ends[self.current_match_index]
         
         # Realizar reemplazo
         cursor = editor.textCursor()
@@ -735,16 +797,16 @@ class SearchReplaceDialog(QDialog):
         
         # Actualizar posiciones de las coincidencias
         diff = len(replace_text) - (end - start)
-        for i in range(len(self.current_matches)):
-            if i > self.current_match_index:
-                old_start, old_end = self.current_matches[i]
-                self.current_matches[i] = (old_start + diff, old_end + diff)
+        for i in range(self.current_match_index + 1, len(self.current_starts)):
+            self.current_starts[i] += diff
+            self.current_ends[i] += diff
         
         # Remover la coincidencia reemplazada
-        self.current_matches.pop(self.current_match_index)
+        self.current_starts.pop(self.current_match_index)
+        self.current_ends.pop(self.current_match_index)
         
-        if self.current_matches:
-            if self.current_match_index >= len(self.current_matches):
+        if self.current_starts:
+            if self.current_match_index >= len(self.current_starts):
                 self.current_match_index = 0
             self._highlight_current_match()
             self._update_results_label()
@@ -754,7 +816,7 @@ class SearchReplaceDialog(QDialog):
     
     def _replace_all(self):
         """Reemplazar todas las coincidencias"""
-        if not self.current_matches:
+        if not self.current_starts:
             return
             
         editor = self.parent_editor.input_text
@@ -762,7 +824,7 @@ class SearchReplaceDialog(QDialog):
             return
             
         replace_text = self.replace_input.text()
-        count = len(self.current_matches)
+        count = len(self.current_starts)
         
         # Confirmar reemplazo múltiple
         reply = QMessageBox.question(self, "Reemplazar Todo",
@@ -772,27 +834,41 @@ class SearchReplaceDialog(QDialog):
         if reply != QMessageBox.Yes:
             return
         
-        # Realizar reemplazos desde el final hacia el principio para mantener posiciones
-        for start, end in reversed(self.current_matches):
-            cursor = editor.textCursor()
-            cursor.setPosition(start)
-            cursor.setPosition(end, cursor.KeepAnchor)
-            cursor.insertText(replace_text)
+        # Construir el texto final de una vez y aplicarlo en una sola edición (un solo deshacer)
+        document_text = editor.toPlainText()
+        parts = []
+        last_end = 0
+        for start, end in zip(self.current_starts, self.current_ends):
+            parts.append(document_text[last_end:start])
+            parts.append(replace_text)
+            last_end = end
+        parts.append(document_text[last_end:])
+        
+        cursor = editor.textCursor()
+        cursor.beginEditBlock()
+        cursor.select(QTextCursor.SelectionType.Document)
+        cursor.insertText(''.join(parts))
+        cursor.endEditBlock()
         
-        self.current_matches = []
+        self._reset_matches()
         self.current_match_index = -1
         self.results_label.setText(f"Se reemplazaron {count} coincidencias")
     
     def _update_results_label(self):
         """Actualizar etiqueta de resultados"""
-        if self.current_matches:
+        if self.current_starts:
             self.results_label.setText(
-                f"Coincidencia {self.current_match_index + 1} de {len(self.current_matches)}"
+                f"Coincidencia {self.current_match_index + 1} de {len(self.current_starts)}"
             )
     
+    def _reset_matches(self):
+        """Vaciar las posiciones de las coincidencias"""
+        self.current_starts = array('i')
+        self.current_ends = array('i')
+    
     def _clear_search(self):
         """Limpiar búsqueda actual"""
-        self.current_matches = []
+        self._reset_matches()
         self.current_match_index = -1
         self.results_label.setText("Sin resultados")
     
@@ -814,12 +890,308 @@ class SearchReplaceDialog(QDialog):
             super().keyPressEvent(event)
 
 
+@functools.lru_cache(maxsize=64)
+def _build_pattern(search_text, case_sensitive, whole_words, is_regex, use_re2=False):
+    """Compilar (y memorizar) la expresión de búsqueda para las opciones indicadas"""
+    pattern = search_text if is_regex else re.escape(search_text)
+    if whole_words:
+        pattern = r'\b' + pattern + r'\b'
+    
+    if use_re2 and re2 is not None:
+        try:
+            # Las opciones se pasan en línea, que es la forma que aceptan todos los bindings de RE2
+            return re2.compile(('(?m)' if case_sensitive else '(?im)') + pattern)
+        except Exception:
+            pass  # RE2 no admite referencias hacia atrás ni lookaround: usar re
+    
+    # MULTILINE: ^ y $ siguen anclando a cada línea del archivo
+    flags = re.MULTILINE
+    if not case_sensitive:
+        flags |= re.IGNORECASE
+    return re.compile(pattern, flags)
+
+
+def _iter_files(root, include_subdirs, file_patterns):
+    """Recorrer el directorio con os.scandir y devolver las rutas que coinciden con los patrones"""
+    # Unir todos los patrones en una sola expresión (fnmatch ignora mayúsculas donde el sistema lo hace)
+    name_flags = re.IGNORECASE if os.path.normcase('A') == 'a' else 0
+    name_re = re.compile('(?:' + '|'.join(fnmatch.translate(p) for p in file_patterns) + ')', name_flags)
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if include_subdirs:
+                                stack.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False) and name_re.match(entry.name):
+                            yield entry.path
+                    except OSError:
+                        continue
+        except OSError:
+            continue  # Saltar directorios sin permisos de lectura
+
+
+_SNIPPET_SCAN_LIMIT = 1024  # Caracteres máximos que se copian de una línea para el fragmento
+
+
+def _make_snippet(line):
+    """Recortar una línea para mostrarla en la columna de contenido"""
+    stripped = line.strip()
+    return stripped[:100] + "..." if len(stripped) > 100 else stripped
+
+
+@functools.lru_cache(maxsize=64)
+def _build_byte_pattern(search_text, case_sensitive):
+    """Compilar la búsqueda literal ASCII como patrón de bytes para recorrer archivos mapeados en memoria"""
+    return re.compile(re.escape(search_text.encode('ascii')), 0 if case_sensitive else re.IGNORECASE)
+
+
+def _find_literal(haystack, needle):
+    """Devolver la posición de cada aparición (sin solaparse) de un texto literal"""
+    step = len(needle)
+    pos = haystack.find(needle)
+    while pos != -1:
+        yield pos
+        pos = haystack.find(needle, pos + step)
+
+
+def _scan_mapped_file(mm, byte_pattern, rel_path, file_path, literal=None):
+    """Buscar sobre un archivo mapeado con mmap decodificando solo las líneas con coincidencias"""
+    # Literal que distingue mayúsculas: mmap.find recorre los bytes en C sin pasar por el motor de regex
+    if literal is not None and literal[1]:
+        match_starts = _find_literal(mm, literal[0].encode('ascii'))
+    else:
+        match_starts = (match.start() for match in byte_pattern.finditer(mm))
+    
+    results = []
+    line_num = 1
+    last_pos = 0
+    line_end = -1  # fin (salto de línea) de la última línea con coincidencias
+    snippet = None
+    for start in match_starts:
+        line_num += mm[last_pos:start].count(b'\n')
+        last_pos = start
+        # Los límites y el fragmento solo se calculan al pasar a otra línea; la búsqueda hacia
+        # atrás no va más allá del final de la anterior, así que todo el archivo cuesta una pasada
+        if start > line_end:
+            line_start = max(mm.rfind(b'\n', line_end + 1, start), line_end) + 1
+            line_end = mm.find(b'\n', start)
+            if line_end == -1:
+                line_end = len(mm)
+            line = mm[line_start:min(line_end, line_start + _SNIPPET_SCAN_LIMIT)].decode('utf-8', errors='ignore')
+            snippet = _make_snippet(line)
+        results.append((
+            rel_path,
+            line_num,
+            snippet,
+            file_path
+        ))
+    return results
+
+
+def _scan_file(file_path, search_dir, compiled, skip_binary=True, byte_pattern=None, literal=None,
+               text=None):
+    """
+    Buscar coincidencias en un archivo y devolverlas como tuplas (ruta relativa, línea, contenido, ruta)
+    
+    Si se indica `text` se busca sobre ese contenido sin volver a leer el disco. Devuelve
+    (ruta, resultados, texto); el texto es None cuando el archivo no se llegó a decodificar
+    o no tiene coincidencias.
+    """
+    # Todas las coincidencias del archivo comparten la misma cadena de ruta relativa
+    rel_path = sys.intern(os.path.relpath(file_path, search_dir))
+    if text is None:
+        try:
+            file_size = os.stat(file_path).st_size
+            if skip_binary and file_size > AppConfig.SEARCH_MAX_FILE_SIZE:
+                return file_path, [], None
+            with open(file_path, 'rb') as f:
+                # Archivos grandes: buscar directamente sobre las páginas mapeadas, sin decodificarlos
+                if byte_pattern is not None and file_size > AppConfig.SEARCH_MMAP_THRESHOLD:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                        if skip_binary and mm.find(b'\x00', 0, 8192) != -1:
+                            return file_path, [], None
+                        return file_path, _scan_mapped_file(mm, byte_pattern, rel_path, file_path, literal), None
+                
+                # Heurística de grep: un byte nulo al principio indica un archivo binario
+                if skip_binary and b'\x00' in f.read(8192):
+                    return file_path, [], None
+                f.seek(0)
+                text = io.TextIOWrapper(f, encoding='utf-8', errors='ignore').read()
+        except Exception:
+            return file_path, [], None  # Saltar archivos que no se pueden leer
+    
+    results = _scan_text(text, rel_path, file_path, compiled, literal)
+    # El texto solo interesa para refinar la búsqueda: no retenerlo si no hubo coincidencias
+    return file_path, results, text if results else None
+
+
+def _scan_text(text, rel_path, file_path, compiled, literal=None):
+    """Buscar coincidencias sobre el contenido ya decodificado de un archivo"""
+    results = []
+    
+    # Búsqueda literal: str.find evita el motor de expresiones regulares
+    match_starts = None
+    if literal is not None:
+        needle, case_sensitive = literal
+        haystack = text if case_sensitive else text.lower()
+        # lower() puede cambiar la longitud de algunos caracteres; entonces las posiciones no sirven
+        if len(haystack) == len(text):
+            match_starts = _find_literal(haystack, needle if case_sensitive else needle.lower())
+    if match_starts is None:
+        match_starts = (match.start() for match in compiled.finditer(text))
+    
+    # Métodos y globales usados en cada coincidencia, enlazados como variables locales
+    count = text.count
+    rfind = text.rfind
+    find = text.find
+    make_snippet = _make_snippet
+    add_result = results.append
+    text_length = len(text)
+    scan_limit = _SNIPPET_SCAN_LIMIT
+    
+    # Buscar sobre el archivo completo y traducir cada posición a su línea. Las posiciones llegan
+    # en orden, así que basta contar (en C) los saltos de línea desde la coincidencia anterior
+    line_num = 1
+    last_pos = 0
+    line_end = -1  # fin (salto de línea) de la última línea con coincidencias
+    snippet = None
+    for match_start in match_starts:
+        line_num += count('\n', last_pos, match_start)
+        last_pos = match_start
+        # Los límites y el fragmento solo se calculan al pasar a otra línea; la búsqueda hacia
+        # atrás no va más allá del final de la anterior, así que todo el archivo cuesta una pasada
+        if match_start > line_end:
+            line_start = max(rfind('\n', line_end + 1, match_start), line_end) + 1
+            line_end = find('\n', match_start)
+            if line_end == -1:
+                line_end = text_length
+            snippet = make_snippet(text[line_start:min(line_end, line_start + scan_limit)])
+        add_result((
+            rel_path,
+            line_num,
+            snippet,
+            file_path
+        ))
+    return results
+
+
+class MultiFileSearchWorker(QThread):
+    """Hilo que recorre un directorio buscando coincidencias sin bloquear la interfaz"""
+    
+    results_ready = Signal(list)  # Lote de tuplas (ruta relativa, línea, contenido, ruta)
+    search_finished = Signal(int, int)  # (coincidencias, archivos buscados)
+    search_failed = Signal(str)
+    
+    BATCH_SIZE = 256  # Resultados por lote
+    BATCH_INTERVAL = 0.05  # Segundos máximos entre lotes
+    
+    SCAN_CACHE_MAX_CHARS = 50 * 1024 * 1024  # Texto máximo conservado para refinar búsquedas
+    
+    def __init__(self, search_dir, compiled, file_patterns, include_subdirs, skip_binary=True,
+                 byte_pattern=None, literal=None, candidate_files=None):
+        super().__init__()
+        self.search_dir = search_dir
+        self.compiled = compiled
+        self.file_patterns = file_patterns
+        self.include_subdirs = include_subdirs
+        self.skip_binary = skip_binary
+        self.byte_pattern = byte_pattern
+        self.literal = literal  # (texto, distinguir mayúsculas) si la búsqueda no es una expresión
+        # [(ruta, texto o None)] a examinar en lugar de recorrer el directorio
+        self.candidate_files = candidate_files
+        self.matched_files = []  # Archivos con coincidencias, para refinar la siguiente búsqueda
+        
+    def run(self):
+        """Recorrer los archivos y emitir los resultados por lotes"""
+        total_matches = 0
+        files_searched = 0
+        cached_chars = 0
+        pending = []
+        last_emit = time.monotonic()
+        
+        if self.candidate_files is not None:
+            sources = iter(self.candidate_files)
+        else:
+            sources = ((file_path, None) for file_path in
+                       _iter_files(self.search_dir, self.include_subdirs, self.file_patterns))
+        
+        # La búsqueda está limitada por E/S: varios archivos se leen en paralelo
+        max_workers = min(32, (os.cpu_count() or 1) * 4)
+        # Ventana acotada de tareas en curso: los resultados llegan mientras se sigue recorriendo
+        # el directorio y la cola no crece con el tamaño del árbol
+        max_in_flight = 2 * max_workers
+        
+        def consume(done):
+            """Acumula los resultados terminados y emite un lote cuando toca"""
+            nonlocal total_matches, cached_chars, pending, last_emit
+            for future in done:
+                file_path, results, text = future.result()
+                if not results:
+                    continue
+                total_matches += len(results)
+                pending.extend(results)
+                
+                # Conservar el texto para refinar la búsqueda sin volver a leer el disco
+                if text is not None and cached_chars + len(text) <= self.SCAN_CACHE_MAX_CHARS:
+                    cached_chars += len(text)
+                else:
+                    text = None
+                self.matched_files.append((file_path, text))
+            
+            # Emitir un lote cada BATCH_SIZE resultados o BATCH_INTERVAL segundos
+            now = time.monotonic()
+            if pending and (len(pending) >= self.BATCH_SIZE or now - last_emit >= self.BATCH_INTERVAL):
+                self.results_ready.emit(pending)
+                pending = []
+                last_emit = now
+        
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                in_flight = set()
+                for file_path, text in sources:
+                    if self.isInterruptionRequested():
+                        executor.shutdown(cancel_futures=True)
+                        return
+                    
+                    files_searched += 1
+                    in_flight.add(executor.submit(
+                        _scan_file, file_path, self.search_dir, self.compiled,
+                        self.skip_binary, self.byte_pattern, self.literal, text
+                    ))
+                    if len(in_flight) >= max_in_flight:
+                        # Los futuros consumidos se sueltan al quedarse fuera del conjunto
+                        done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                        consume(done)
+                
+                while in_flight:
+                    if self.isInterruptionRequested():
+                        executor.shutdown(cancel_futures=True)
+                        return
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    consume(done)
+            
+            if pending:
+                self.results_ready.emit(pending)
+            self.search_finished.emit(total_matches, files_searched)
+            
+        except Exception as e:
+            self.search_failed.emit(str(e))
+
+
 class MultiFileSearchDialog(QDialog):
     """Diálogo para búsqueda en múltiples archivos"""
     
     def __init__(self, parent=None):
         super().__init__(parent)
         self.parent_editor = parent
+        self.search_worker = None
+        self._scan_cache = None  # (ámbito, consulta, archivos con coincidencias) de la última búsqueda
+        self._search_key = None
+        self._reset_result_paths()
         self.setWindowTitle("Buscar en Múltiples Archivos")
         self.setFixedSize(800, 600)
         self.setModal(False)
@@ -881,11 +1253,20 @@ class MultiFileSearchDialog(QDialog):
         self.regex_cb = QCheckBox("Expresiones regulares")
         self.include_subdirs_cb = QCheckBox("Incluir subdirectorios")
         self.include_subdirs_cb.setChecked(True)
+        self.skip_binary_cb = QCheckBox("Omitir archivos binarios y muy grandes")
+        self.skip_binary_cb.setChecked(AppConfig.SEARCH_SKIP_BINARY_FILES)
+        self.use_re2_cb = QCheckBox("Usar motor RE2 (tiempo lineal)")
+        self.use_re2_cb.setChecked(re2 is not None and AppConfig.SEARCH_USE_RE2)
+        self.use_re2_cb.setEnabled(re2 is not None)
+        if re2 is None:
+            self.use_re2_cb.setToolTip("Instala el paquete 'google-re2' para habilitarlo")
         
         options_layout.addWidget(self.case_sensitive_cb, 0, 0)
         options_layout.addWidget(self.whole_words_cb, 0, 1)
         options_layout.addWidget(self.regex_cb, 1, 0)
         options_layout.addWidget(self.include_subdirs_cb, 1, 1)
+        options_layout.addWidget(self.skip_binary_cb, 2, 0)
+        options_layout.addWidget(self.use_re2_cb, 2, 1)
         
         layout.addWidget(options_group)
         
@@ -948,82 +1329,165 @@ class MultiFileSearchDialog(QDialog):
             QMessageBox.warning(self, "Advertencia", "El directorio no existe")
             return
         
+        # Detener una búsqueda anterior que siga en curso
+        self._stop_search_worker()
+        
         # Limpiar resultados anteriores
         self.results_tree.clear()
+        self._reset_result_paths()
         self.results_status.setText("Buscando...")
-        QApplication.processEvents()
         
         try:
-            # Configurar opciones
-            flags = 0
-            if not self.case_sensitive_cb.isChecked():
-                flags |= re.IGNORECASE
-                
-            # Preparar patrón
-            if self.regex_cb.isChecked():
-                pattern = search_text
-            else:
-                pattern = re.escape(search_text)
-                
-            if self.whole_words_cb.isChecked():
-                pattern = r'\b' + pattern + r'\b'
-            
-            # Obtener patrones de archivo
-            file_patterns = [p.strip() for p in self.patterns_input.text().split(';') if p.strip()]
-            if not file_patterns:
-                file_patterns = ['*']
-            
-            total_matches = 0
-            files_searched = 0
-            
-            # Buscar archivos
-            for root, dirs, files in os.walk(search_dir):
-                if not self.include_subdirs_cb.isChecked() and root != search_dir:
-                    break
-                    
-                for file in files:
-                    # Verificar si el archivo coincide con los patrones
-                    if not any(fnmatch.fnmatch(file, pattern) for pattern in file_patterns):
-                        continue
-                        
-                    file_path = os.path.join(root, file)
-                    files_searched += 1
-                    
-                    try:
-                        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                            for line_num, line in enumerate(f, 1):
-                                matches = list(re.finditer(pattern, line, flags))
-                                for match in matches:
-                                    # Crear elemento en el árbol
-                                    item = QTreeWidgetItem()
-                                    item.setText(0, os.path.relpath(file_path, search_dir))
-                                    item.setText(1, str(line_num))
-                                    item.setText(2, line.strip()[:100] + "..." if len(line.strip()) > 100 else line.strip())
-                                    item.setData(0, Qt.ItemDataRole.UserRole, file_path)
-                                    item.setData(1, Qt.ItemDataRole.UserRole, line_num)
-                                    self.results_tree.addTopLevelItem(item)
-                                    total_matches += 1
-                                    
-                    except Exception as e:
-                        continue  # Saltar archivos que no se pueden leer
-            
-            self.results_status.setText(
-                f"Búsqueda completada: {total_matches} coincidencias en {files_searched} archivos"
+            compiled = _build_pattern(
+                search_text,
+                self.case_sensitive_cb.isChecked(),
+                self.whole_words_cb.isChecked(),
+                self.regex_cb.isChecked(),
+                self.use_re2_cb.isChecked()
             )
-            
         except re.error as e:
             self.results_status.setText(f"Error en expresión regular: {str(e)}")
-        except Exception as e:
-            self.results_status.setText(f"Error durante la búsqueda: {str(e)}")
+            return
+        
+        # Las búsquedas literales no necesitan el motor de expresiones regulares, y si son ASCII
+        # pueden recorrer los archivos grandes como bytes (mmap) sin cambiar el resultado
+        literal = None
+        byte_pattern = None
+        if not self.regex_cb.isChecked() and not self.whole_words_cb.isChecked():
+            literal = (search_text, self.case_sensitive_cb.isChecked())
+            if search_text.isascii():
+                byte_pattern = _build_byte_pattern(search_text, self.case_sensitive_cb.isChecked())
+        
+        # Obtener patrones de archivo
+        file_patterns = [p.strip() for p in self.patterns_input.text().split(';') if p.strip()]
+        if not file_patterns:
+            file_patterns = ['*']
+        
+        # Si la consulta solo restringe la anterior, basta con examinar los archivos que ya coincidían
+        scope = (search_dir, tuple(file_patterns), self.include_subdirs_cb.isChecked(),
+                 self.skip_binary_cb.isChecked())
+        query = (search_text, self.case_sensitive_cb.isChecked(),
+                 self.whole_words_cb.isChecked(), self.regex_cb.isChecked())
+        candidate_files = None
+        if self._is_refinement(scope, query):
+            candidate_files = self._scan_cache[2]
+            self.results_status.setText("Refinando los resultados anteriores...")
+        self._search_key = (scope, query)
+        self._scan_cache = None
+        
+        # Recorrer los archivos en un hilo aparte para no bloquear la interfaz
+        self.search_worker = MultiFileSearchWorker(
+            search_dir, compiled, file_patterns,
+            self.include_subdirs_cb.isChecked(), self.skip_binary_cb.isChecked(),
+            byte_pattern, literal, candidate_files
+        )
+        self.search_worker.results_ready.connect(self._on_results_ready)
+        self.search_worker.search_finished.connect(self._on_search_finished)
+        self.search_worker.search_failed.connect(self._on_search_failed)
+        self.search_btn.setEnabled(False)
+        self.search_worker.start()
+    
+    def _is_refinement(self, scope, query):
+        """Indicar si la consulta solo puede coincidir donde coincidía la búsqueda anterior"""
+        if self._scan_cache is None:
+            return False
+        last_scope, last_query, _ = self._scan_cache
+        if scope != last_scope or query == last_query:
+            return False
+        
+        last_text, last_case, last_whole, last_regex = last_query
+        text, case_sensitive, _, is_regex = query
+        # Solo se puede razonar sobre búsquedas literales que contienen a la anterior
+        if last_regex or last_whole or is_regex:
+            return False
+        if last_case:
+            return case_sensitive and last_text in text
+        return last_text.lower() in text.lower()
+    
+    def _reset_result_paths(self):
+        """Vaciar la tabla de rutas de los resultados"""
+        self._result_paths = []
+        self._result_path_ids = {}
+    
+    def _stop_search_worker(self):
+        """Detener el hilo de búsqueda si está en ejecución"""
+        if self.search_worker is not None and self.search_worker.isRunning():
+            self.search_worker.requestInterruption()
+            self.search_worker.wait()
+        self.search_worker = None
+        self.search_btn.setEnabled(True)
+    
+    def _on_results_ready(self, batch):
+        """Insertar en el árbol un lote de resultados emitido por el hilo de búsqueda"""
+        if self.sender() is not self.search_worker:
+            return  # Lote de una búsqueda ya cancelada
+        
+        # Búsquedas de nombres resueltas una vez por lote y no una vez por resultado
+        user_role = Qt.ItemDataRole.UserRole
+        tree_item = QTreeWidgetItem
+        result_paths = self._result_paths
+        path_ids = self._result_path_ids
+        items = []
+        add_item = items.append
+        for rel_path, line_num, snippet, file_path in batch:
+            # Cada elemento guarda un índice entero; la ruta completa se almacena una vez por archivo
+            path_id = path_ids.get(file_path)
+            if path_id is None:
+                path_id = len(result_paths)
+                result_paths.append(file_path)
+                path_ids[file_path] = path_id
+            
+            item = tree_item()
+            item.setText(0, rel_path)
+            item.setText(1, str(line_num))
+            item.setText(2, snippet)
+            item.setData(0, user_role, path_id)
+            item.setData(1, user_role, line_num)
+            add_item(item)
+        
+        # Un único repintado y sin reordenar por cada lote insertado
+        sorting_enabled = self.results_tree.isSortingEnabled()
+        self.results_tree.setSortingEnabled(False)
+        self.results_tree.setUpdatesEnabled(False)
+        try:
+            self.results_tree.addTopLevelItems(items)
+        finally:
+            self.results_tree.setUpdatesEnabled(True)
+            self.results_tree.setSortingEnabled(sorting_enabled)
+    
+    def _on_search_finished(self, total_matches, files_searched):
+        """Mostrar el resumen cuando el hilo termina de buscar"""
+        if self.sender() is not self.search_worker:
+            return
+        self._scan_cache = (*self._search_key, self.search_worker.matched_files)
+        self.search_btn.setEnabled(True)
+        self.results_status.setText(
+            f"Búsqueda completada: {total_matches} coincidencias en {files_searched} archivos"
+        )
+    
+    def _on_search_failed(self, message):
+        """Mostrar un error producido durante la búsqueda"""
+        if self.sender() is not self.search_worker:
+            return
+        self.search_btn.setEnabled(True)
+        self.results_status.setText(f"Error durante la búsqueda: {message}")
+    
+    def closeEvent(self, event):
+        """Detener la búsqueda en curso al cerrar el diálogo"""
+        self._stop_search_worker()
+        super().closeEvent(event)
     
     def _clear_results(self):
         """Limpiar resultados"""
         self.results_tree.clear()
+        self._reset_result_paths()
+        self._scan_cache = None
         self.results_status.setText("Listo para buscar")
     
     def _open_result(self, item):
         """Abrir archivo y navegar a la línea"""
-        file_path = item.data(0, Qt.ItemDataRole.UserRole)
+        path_id = item.data(0, Qt.ItemDataRole.UserRole)
+        file_path = self._result_paths[path_id] if path_id is not None else None
         line_num = item.data(1, Qt.ItemDataRole.UserRole)
         
         if file_path and self.parent_editor:
@@ -1033,17 +1497,69 @@ class MultiFileSearchDialog(QDialog):
             # Navegar a la línea específica
             if hasattr(self.parent_editor, 'input_text') and self.parent_editor.input_text:
                 editor = self.parent_editor.input_text
+                block = editor.document().findBlockByNumber(line_num - 1)
                 cursor = editor.textCursor()
-                cursor.movePosition(cursor.Start)
-                for _ in range(line_num - 1):
-                    cursor.movePosition(cursor.Down)
+                cursor.setPosition(block.position() if block.isValid() else 0)
                 editor.setTextCursor(cursor)
                 editor.ensureCursorVisible()
 
 
+# Hojas de estilo fijas del diálogo de preferencias
+_COLORS_NOTE_QSS = """
+            QLabel {
+                background-color: #EBF5FB;
+                border: 1px solid #3498DB;
+                border-radius: 5px;
+                padding: 10px;
+                margin: 10px 0;
+            }
+        """
+_INSTALL_NOTE_QSS = """
+            QLabel {
+                background-color: #EBF5FB;
+                border: 1px solid #3498DB;
+                border-radius: 5px;
+                padding: 8px;
+                font-size: 11px;
+            }
+        """
+
+
 class PreferencesDialog(QDialog):
     """Ventana de preferencias para personalizar el editor"""
     
+    _COLOR_BUTTON_QSS = ("QPushButton {{ background-color: {bg}; border: 2px solid #34495E; "
+                         "border-radius: 5px; color: {fg}; font-weight: bold; }}")
+    
+    # Motores del combo de formateo, en el mismo orden que sus entradas
+    _ENGINE_MAP = ('manual', 'autopep8', 'black')
+    _ENGINE_INFO_TEXTS = (
+        "<b>Manual (Básico):</b><br>• Formateo básico integrado<br>• Ajuste de indentación y espaciado<br>• Organización simple de imports<br>• No requiere dependencias externas",
+        "<b>autopep8 (Recomendado):</b><br>• Formateo automático según PEP 8<br>• Corrección de errores de estilo<br>• Configuración flexible<br>• Requiere: pip install autopep8",
+        "<b>black (Estricto):</b><br>• Formateo muy estricto y consistente<br>• Sin configuración (opinionated)<br>• Usado por muchos proyectos de Python<br>• Requiere: pip install black",
+    )
+    
+    # Resultado de formatear el código de ejemplo, por (motor, hash del código)
+    _FORMAT_SAMPLE_CACHE = {}
+    
+    # Filas del tab Colores: (etiqueta, clave de configuración, atributo del botón)
+    _COLOR_ROWS = (
+        ("Fondo del Editor:", 'editor_bg_color', 'editor_bg_button'),
+        ("Texto del Editor:", 'editor_text_color', 'editor_text_button'),
+        ("Selección:", 'editor_selection_color', 'editor_selection_button'),
+    )
+    
+    # Todos los botones de color del diálogo: (atributo del botón, clave de configuración)
+    _COLOR_BUTTONS = (
+        ('editor_bg_button', 'editor_bg_color'),
+        ('editor_text_button', 'editor_text_color'),
+        ('editor_selection_button', 'editor_selection_color'),
+        ('line_bg_button', 'line_number_bg_color'),
+        ('line_text_button', 'line_number_text_color'),
+        ('output_bg_button', 'output_bg_color'),
+        ('output_text_button', 'output_text_color'),
+    )
+    
     def __init__(self, parent=None, current_settings=None):
         super().__init__(parent)
         self.parent_editor = parent
@@ -1054,8 +1570,18 @@ class PreferencesDialog(QDialog):
         # Configuraciones actuales
         self.current_settings = current_settings or self._get_default_settings()
         self.new_settings = self.current_settings.copy()
+        # Últimas preferencias aplicadas al editor (para omitir aplicaciones sin cambios)
+        self._last_applied_settings = dict(self.current_settings)
+        
+        # Formatter de prueba y disponibilidad de motores (se crean al primer uso)
+        self._cached_formatter = None
+        self._engine_specs = {}
+        self._test_dialog = None  # diálogo de resultado, hijo de este diálogo
         
         self._setup_ui()
+        
+        # Cerrar con ESC
+        QShortcut(QKeySequence(Qt.Key.Key_Escape), self, activated=self.reject)
     
     def _get_default_settings(self):
         """Configuraciones por defecto"""
@@ -1186,31 +1712,31 @@ class PreferencesDialog(QDialog):
         """Actualiza los controles del diálogo con los valores del tema"""
         # Actualizar controles del tab Editor
         if hasattr(self, 'editor_font_combo'):
-            self.editor_font_combo.setCurrentText(theme_settings['editor_font_family'])
+            self._select_font(self.editor_font_combo, self._editor_font_indices,
+                              theme_settings['editor_font_family'])
         if hasattr(self, 'editor_font_size'):
             self.editor_font_size.setValue(theme_settings['editor_font_size'])
         
         # Actualizar controles del tab Salida
         if hasattr(self, 'output_font_combo'):
-            self.output_font_combo.setCurrentText(theme_settings['output_font_family'])
+            self._select_font(self.output_font_combo, self._output_font_indices,
+                              theme_settings['output_font_family'])
         if hasattr(self, 'output_font_size'):
             self.output_font_size.setValue(theme_settings['output_font_size'])
         
         # Actualizar botones de color
-        if hasattr(self, 'editor_bg_button'):
-            self._update_color_button(self.editor_bg_button, theme_settings['editor_bg_color'])
-        if hasattr(self, 'editor_text_button'):
-            self._update_color_button(self.editor_text_button, theme_settings['editor_text_color'])
-        if hasattr(self, 'editor_selection_button'):
-            self._update_color_button(self.editor_selection_button, theme_settings['editor_selection_color'])
-        if hasattr(self, 'line_bg_button'):
-            self._update_color_button(self.line_bg_button, theme_settings['line_number_bg_color'])
-        if hasattr(self, 'line_text_button'):
-            self._update_color_button(self.line_text_button, theme_settings['line_number_text_color'])
-        if hasattr(self, 'output_bg_button'):
-            self._update_color_button(self.output_bg_button, theme_settings['output_bg_color'])
-        if hasattr(self, 'output_text_button'):
-            self._update_color_button(self.output_text_button, theme_settings['output_text_color'])
+        for attr, key in self._COLOR_BUTTONS:
+            button = getattr(self, attr, None)
+            if button is not None:
+                self._update_color_button(button, theme_settings[key])
+    
+    def _select_font(self, combo, font_indices, family):
+        """Selecciona una familia en el combo usando el índice precalculado"""
+        index = font_indices.get(family, -1)
+        if index >= 0:
+            combo.setCurrentIndex(index)
+        else:
+            combo.setCurrentText(family)
     
     def _update_theme_preview(self):
         """Actualiza la vista previa del tema"""
@@ -1266,30 +1792,20 @@ class PreferencesDialog(QDialog):
         """Configura la interfaz de preferencias"""
         layout = QVBoxLayout(self)
         
-        # Crear tabs
-        tabs = QTabWidget()
-        
-        # Tab Temas (nuevo)
-        themes_tab = self._create_themes_tab()
-        tabs.addTab(themes_tab, "🎭 Temas")
-        
-        # Tab Formatter (nuevo)
-        formatter_tab = self._create_formatter_tab()
-        tabs.addTab(formatter_tab, "🔧 Formatter")
-        
-        # Tab Editor
-        editor_tab = self._create_editor_tab()
-        tabs.addTab(editor_tab, "🖥️ Editor")
-        
-        # Tab Salida
-        output_tab = self._create_output_tab()
-        tabs.addTab(output_tab, "📤 Salida")
-        
-        # Tab Colores
-        colors_tab = self._create_colors_tab()
-        tabs.addTab(colors_tab, "🎨 Colores")
-        
-        layout.addWidget(tabs)
+        # Crear tabs: solo el de Temas se construye al abrir, el resto al activarse
+        self.tabs = QTabWidget()
+        self.tabs.addTab(self._create_themes_tab(), "🎭 Temas")
+        self._tab_builders = {}
+        self._tab_built = {0}
+        for builder, label in ((self._create_formatter_tab, "🔧 Formatter"),
+                               (self._create_editor_tab, "🖥️ Editor"),
+                               (self._create_output_tab, "📤 Salida"),
+                               (self._create_colors_tab, "🎨 Colores")):
+            index = self.tabs.addTab(QWidget(), label)
+            self._tab_builders[index] = builder
+        self.tabs.currentChanged.connect(self._ensure_tab_built)
+        
+        layout.addWidget(self.tabs)
         
         # Botones
         button_layout = QHBoxLayout()
@@ -1362,6 +1878,24 @@ class PreferencesDialog(QDialog):
         
         layout.addLayout(button_layout)
     
+    def _ensure_tab_built(self, index):
+        """Construye el contenido real de un tab la primera vez que se activa"""
+        if index in self._tab_built or index not in self._tab_builders:
+            return
+        self._tab_built.add(index)
+        label = self.tabs.tabText(index)
+        real_widget = self._tab_builders[index]()
+        # Sincronizar con cambios hechos antes de construir el tab (tema, restablecer)
+        self._update_controls_from_theme(self.new_settings)
+        
+        self.tabs.blockSignals(True)
+        placeholder = self.tabs.widget(index)
+        self.tabs.removeTab(index)
+        self.tabs.insertTab(index, real_widget, label)
+        self.tabs.setCurrentIndex(index)
+        self.tabs.blockSignals(False)
+        placeholder.deleteLater()
+    
     def _create_editor_tab(self):
         """Crea el tab de configuración del editor"""
         widget = QWidget()
@@ -1386,6 +1920,9 @@ class PreferencesDialog(QDialog):
             if font not in monospace_fonts:
                 self.editor_font_combo.addItem(font)
         
+        # Índice de cada familia, para seleccionar sin buscar por texto al cambiar tema/restablecer
+        self._editor_font_indices = {self.editor_font_combo.itemText(i): i
+                                     for i in range(self.editor_font_combo.count())}
         self.editor_font_combo.setCurrentText(self.current_settings['editor_font_family'])
         font_layout.addWidget(self.editor_font_combo, 0, 1)
         
@@ -1446,6 +1983,8 @@ class PreferencesDialog(QDialog):
             if font not in monospace_fonts:
                 self.output_font_combo.addItem(font)
         
+        self._output_font_indices = {self.output_font_combo.itemText(i): i
+                                     for i in range(self.output_font_combo.count())}
         self.output_font_combo.setCurrentText(self.current_settings['output_font_family'])
         font_layout.addWidget(self.output_font_combo, 0, 1)
         
@@ -1494,29 +2033,15 @@ class PreferencesDialog(QDialog):
         colors_group.setMinimumWidth(400)
         colors_layout = QGridLayout(colors_group)
         
-        # Color de fondo del editor
-        colors_layout.addWidget(QLabel("Fondo del Editor:"), 0, 0)
-        self.editor_bg_button = QPushButton()
-        self.editor_bg_button.setFixedHeight(30)
-        self.editor_bg_button.clicked.connect(lambda: self._choose_color('editor_bg_color', self.editor_bg_button))
-        self._update_color_button(self.editor_bg_button, self.current_settings['editor_bg_color'])
-        colors_layout.addWidget(self.editor_bg_button, 0, 1)
-        
-        # Color de texto del editor
-        colors_layout.addWidget(QLabel("Texto del Editor:"), 1, 0)
-        self.editor_text_button = QPushButton()
-        self.editor_text_button.setFixedHeight(30)
-        self.editor_text_button.clicked.connect(lambda: self._choose_color('editor_text_color', self.editor_text_button))
-        self._update_color_button(self.editor_text_button, self.current_settings['editor_text_color'])
-        colors_layout.addWidget(self.editor_text_button, 1, 1)
-        
-        # Color de selección
-        colors_layout.addWidget(QLabel("Selección:"), 2, 0)
-        self.editor_selection_button = QPushButton()
-        self.editor_selection_button.setFixedHeight(30)
-        self.editor_selection_button.clicked.connect(lambda: self._choose_color('editor_selection_color', self.editor_selection_button))
-        self._update_color_button(self.editor_selection_button, self.current_settings['editor_selection_color'])
-        colors_layout.addWidget(self.editor_selection_button, 2, 1)
+        # Un botón por color del editor (fondo, texto, selección)
+        for row, (label, key, attr) in enumerate(self._COLOR_ROWS):
+            button = QPushButton()
+            button.setFixedHeight(30)
+            button.clicked.connect(lambda _=False, k=key, b=button: self._choose_color(k, b))
+            self._update_color_button(button, self.current_settings[key])
+            setattr(self, attr, button)
+            colors_layout.addWidget(QLabel(label), row, 0)
+            colors_layout.addWidget(button, row, 1)
         
         layout.addWidget(colors_group)
         
@@ -1527,15 +2052,7 @@ al hacer clic en "Vista Previa" o "Aceptar". Puedes usar "Restablecer"
 para volver a los colores predeterminados.
         """)
         info_label.setWordWrap(True)
-        info_label.setStyleSheet("""
-            QLabel {
-                background-color: #EBF5FB;
-                border: 1px solid #3498DB;
-                border-radius: 5px;
-                padding: 10px;
-                margin: 10px 0;
-            }
-        """)
+        info_label.setStyleSheet(_COLORS_NOTE_QSS)
         layout.addWidget(info_label)
         
         layout.addStretch()
@@ -1664,6 +2181,15 @@ para volver a los colores predeterminados.
         
         layout.addWidget(options_group)
         
+        # Controles que dependen de tener el formatter habilitado
+        self._formatter_dependent_widgets = (
+            self.formatter_auto_save_checkbox, self.formatter_engine_combo,
+            self.formatter_line_length, self.formatter_indent_size,
+            self.formatter_use_tabs_checkbox, self.formatter_organize_imports_checkbox,
+            self.formatter_remove_trailing_checkbox, self.formatter_final_newline_checkbox,
+            self.formatter_auto_spacing_checkbox,
+        )
+        
         # Botón de prueba
         test_button = QPushButton("🧪 Probar Formatter")
         test_button.clicked.connect(self._test_formatter)
@@ -1679,15 +2205,7 @@ para volver a los colores predeterminados.
 Instalar desde terminal: pip install autopep8 black isort
         """)
         install_info.setWordWrap(True)
-        install_info.setStyleSheet("""
-            QLabel {
-                background-color: #EBF5FB;
-                border: 1px solid #3498DB;
-                border-radius: 5px;
-                padding: 8px;
-                font-size: 11px;
-            }
-        """)
+        install_info.setStyleSheet(_INSTALL_NOTE_QSS)
         install_layout.addWidget(install_info)
         
         layout.addWidget(install_group)
@@ -1700,25 +2218,17 @@ Instalar desde terminal: pip install autopep8 black isort
         """Manejar cambio en habilitar/deshabilitar formatter"""
         enabled = state == 2  # 2 = checked
         
-        # Habilitar/deshabilitar otros controles
-        for widget in [self.formatter_auto_save_checkbox, self.formatter_engine_combo,
-                      self.formatter_line_length, self.formatter_indent_size,
-                      self.formatter_use_tabs_checkbox, self.formatter_organize_imports_checkbox,
-                      self.formatter_remove_trailing_checkbox, self.formatter_final_newline_checkbox,
-                      self.formatter_auto_spacing_checkbox]:
-            widget.setEnabled(enabled)
+        # Habilitar/deshabilitar otros controles con un solo repintado
+        self.setUpdatesEnabled(False)
+        try:
+            for widget in self._formatter_dependent_widgets:
+                widget.setEnabled(enabled)
+        finally:
+            self.setUpdatesEnabled(True)
     
     def _update_engine_info(self):
         """Actualiza la información del motor seleccionado"""
-        engine_index = self.formatter_engine_combo.currentIndex()
-        
-        info_texts = [
-            "<b>Manual (Básico):</b><br>• Formateo básico integrado<br>• Ajuste de indentación y espaciado<br>• Organización simple de imports<br>• No requiere dependencias externas",
-            "<b>autopep8 (Recomendado):</b><br>• Formateo automático según PEP 8<br>• Corrección de errores de estilo<br>• Configuración flexible<br>• Requiere: pip install autopep8",
-            "<b>black (Estricto):</b><br>• Formateo muy estricto y consistente<br>• Sin configuración (opinionated)<br>• Usado por muchos proyectos de Python<br>• Requiere: pip install black"
-        ]
-        
-        self.engine_info_label.setText(info_texts[engine_index])
+        self.engine_info_label.setText(self._ENGINE_INFO_TEXTS[self.formatter_engine_combo.currentIndex()])
     
     def _test_formatter(self):
         """Prueba el formatter con código de ejemplo"""
@@ -1745,74 +2255,96 @@ def calcular(precio,descuento):
     return round(precio_final, 2)
 '''
         
-        # Crear diálogo para mostrar resultado
-        dialog = QDialog(self)
-        dialog.setWindowTitle("Prueba del Formatter")
-        dialog.setFixedSize(700, 550)  # Aumentado un poco para mejor visibilidad
-        
-        layout = QVBoxLayout(dialog)
-        
-        # Código original
-        layout.addWidget(QLabel("Código original:"))
-        original_text = QTextEdit()
-        original_text.setPlainText(sample_code)
-        original_text.setMaximumHeight(170)  # Aumentado un poco
-        layout.addWidget(original_text)
-        
-        # Código formateado
-        layout.addWidget(QLabel("Código formateado:"))
-        formatted_text = QTextEdit()
-        formatted_text.setMaximumHeight(220)  # Aumentado para mejor visibilidad
+        # Reutilizar el diálogo de resultado entre pruebas
+        if self._test_dialog is None:
+            self._build_test_dialog()
+        self._test_original_text.setPlainText(sample_code)
         
         # Aplicar formateo de prueba
         try:
-            # Simular configuración del formatter
-            from utils.code_formatter import CodeFormatter
-            
-            formatter = CodeFormatter()
+            # Crear el formatter solo la primera vez que se prueba
+            if self._cached_formatter is None:
+                from utils.code_formatter import CodeFormatter
+                self._cached_formatter = CodeFormatter()
             
             # Obtener motor seleccionado
-            engine_map = {0: 'manual', 1: 'autopep8', 2: 'black'}
-            engine = engine_map[self.formatter_engine_combo.currentIndex()]
-            
-            # Aplicar formateo con supresión de warnings
-            import warnings
-            with warnings.catch_warnings():
-                warnings.simplefilter("ignore")
-                formatted_code = formatter.format_code(sample_code, engine)
-            
-            formatted_text.setPlainText(formatted_code)
-            layout.addWidget(formatted_text)
+            engine = self._ENGINE_MAP[self.formatter_engine_combo.currentIndex()]
+            # Sin el módulo instalado el formatter acabaría en el modo manual
+            format_engine = engine if self._is_engine_installed(engine) else 'manual'
+            
+            # El código de ejemplo es constante: basta formatearlo una vez por motor
+            cache_key = (format_engine, hash(sample_code))
+            formatted_code = self._FORMAT_SAMPLE_CACHE.get(cache_key)
+            if formatted_code is None:
+                # Aplicar formateo con supresión de warnings
+                import warnings
+                with warnings.catch_warnings():
+                    warnings.simplefilter("ignore")
+                    formatted_code = self._cached_formatter.format_code(sample_code, format_engine)
+                self._FORMAT_SAMPLE_CACHE[cache_key] = formatted_code
+            
+            self._test_formatted_text.setPlainText(formatted_code)
             
             # Información sobre el formateo
-            info_text = f"✅ Formateo completado exitosamente con motor: {engine}"
-            info_label = QLabel(info_text)
-            info_label.setStyleSheet("color: green; font-weight: bold;")
-            layout.addWidget(info_label)
+            self._test_info_label.setText(f"✅ Formateo completado exitosamente con motor: {format_engine}")
+            self._test_info_label.setStyleSheet("color: green; font-weight: bold;")
             
         except Exception as e:
-            import traceback
             error_details = str(e)
-            formatted_text.setPlainText(f"Error al formatear:\n{error_details}")
+            self._test_formatted_text.setPlainText(f"Error al formatear:\n{error_details}")
             
             # Añadir información sobre motores disponibles
             try:
                 from utils.code_formatter import FormatterPreferences
                 available_engines = FormatterPreferences.get_available_engines()
-                formatted_text.append(f"\n\nMotores disponibles: {', '.join(available_engines)}")
+                self._test_formatted_text.append(f"\n\nMotores disponibles: {', '.join(available_engines)}")
             except:
                 pass
-                
-            error_label = QLabel("❌ Error en el formateo")
-            error_label.setStyleSheet("color: red; font-weight: bold;")
-            layout.addWidget(error_label)
+            
+            self._test_info_label.setText("❌ Error en el formateo")
+            self._test_info_label.setStyleSheet("color: red; font-weight: bold;")
+        
+        self._test_dialog.exec()
+    
+    def _build_test_dialog(self):
+        """Crea (una sola vez) el diálogo que muestra el resultado de la prueba"""
+        dialog = QDialog(self)
+        dialog.setWindowTitle("Prueba del Formatter")
+        dialog.setFixedSize(700, 550)  # Aumentado un poco para mejor visibilidad
+        
+        layout = QVBoxLayout(dialog)
+        
+        # Código original
+        layout.addWidget(QLabel("Código original:"))
+        self._test_original_text = QTextEdit()
+        self._test_original_text.setMaximumHeight(170)  # Aumentado un poco
+        layout.addWidget(self._test_original_text)
+        
+        # Código formateado
+        layout.addWidget(QLabel("Código formateado:"))
+        self._test_formatted_text = QTextEdit()
+        self._test_formatted_text.setMaximumHeight(220)  # Aumentado para mejor visibilidad
+        layout.addWidget(self._test_formatted_text)
+        
+        # Resultado del formateo
+        self._test_info_label = QLabel()
+        layout.addWidget(self._test_info_label)
         
         # Botón cerrar
         close_button = QPushButton("Cerrar")
         close_button.clicked.connect(dialog.accept)
         layout.addWidget(close_button)
         
-        dialog.exec()
+        self._test_dialog = dialog
+    
+    def _is_engine_installed(self, engine):
+        """Comprueba (una vez por diálogo) si el módulo del motor está instalado"""
+        if engine == 'manual':
+            return True
+        if engine not in self._engine_specs:
+            import importlib.util
+            self._engine_specs[engine] = importlib.util.find_spec(engine) is not None
+        return self._engine_specs[engine]
     
     def _choose_color(self, setting_key, button):
         """Abre el selector de color"""
@@ -1825,18 +2357,16 @@ def calcular(precio,descuento):
     
     def _update_color_button(self, button, color):
         """Actualiza el botón con el color seleccionado"""
-        button.setStyleSheet(f"""
-            QPushButton {{
-                background-color: {color};
-                border: 2px solid #34495E;
-                border-radius: 5px;
-                color: {'white' if self._is_dark_color(color) else 'black'};
-                font-weight: bold;
-            }}
-        """)
+        # Nada que hacer si el botón ya muestra ese color
+        if button.text() == color.upper():
+            return
+        fg = 'white' if PreferencesDialog._is_dark_color(color) else 'black'
+        button.setStyleSheet(self._COLOR_BUTTON_QSS.format(bg=color, fg=fg))
         button.setText(color.upper())
     
-    def _is_dark_color(self, color_hex):
+    @staticmethod
+    @functools.lru_cache(maxsize=64)
+    def _is_dark_color(color_hex):
         """Determina si un color es oscuro"""
         color = QColor(color_hex)
         # Fórmula de luminancia
@@ -1846,39 +2376,36 @@ def calcular(precio,descuento):
     def _apply_preview(self):
         """Aplica una vista previa de los cambios"""
         self._update_new_settings()
-        if hasattr(self.parent_editor, 'apply_preferences'):
+        if hasattr(self.parent_editor, 'apply_preferences') and self._settings_changed():
             # Para vista previa, aplicar pero no guardar permanentemente
             self.parent_editor.apply_preferences(self.new_settings, preview=True)
+            self._last_applied_settings = dict(self.new_settings)
+    
+    def _settings_changed(self):
+        """Indica si new_settings difiere de lo último aplicado al editor"""
+        return any(self._last_applied_settings.get(key) != value
+                   for key, value in self.new_settings.items())
     
     def _reset_to_defaults(self):
         """Restablece a configuraciones por defecto"""
         defaults = self._get_default_settings()
         self.new_settings = defaults.copy()
         
-        # Actualizar controles
-        self.editor_font_combo.setCurrentText(defaults['editor_font_family'])
-        self.editor_font_size.setValue(defaults['editor_font_size'])
-        self.output_font_combo.setCurrentText(defaults['output_font_family'])
-        self.output_font_size.setValue(defaults['output_font_size'])
-        
-        # Actualizar botones de color
-        self._update_color_button(self.editor_bg_button, defaults['editor_bg_color'])
-        self._update_color_button(self.editor_text_button, defaults['editor_text_color'])
-        self._update_color_button(self.editor_selection_button, defaults['editor_selection_color'])
-        self._update_color_button(self.line_bg_button, defaults['line_number_bg_color'])
-        self._update_color_button(self.line_text_button, defaults['line_number_text_color'])
-        self._update_color_button(self.output_bg_button, defaults['output_bg_color'])
-        self._update_color_button(self.output_text_button, defaults['output_text_color'])
+        # Actualizar controles (solo los de tabs ya construidos)
+        self._update_controls_from_theme(defaults)
         
         # Aplicar vista previa de los valores por defecto
         self._apply_preview()
     
     def _update_new_settings(self):
         """Actualiza las nuevas configuraciones con los valores de los controles"""
-        self.new_settings['editor_font_family'] = self.editor_font_combo.currentText()
-        self.new_settings['editor_font_size'] = self.editor_font_size.value()
-        self.new_settings['output_font_family'] = self.output_font_combo.currentText()
-        self.new_settings['output_font_size'] = self.output_font_size.value()
+        # Los tabs aún no construidos conservan los valores de new_settings
+        if hasattr(self, 'editor_font_combo'):
+            self.new_settings['editor_font_family'] = self.editor_font_combo.currentText()
+            self.new_settings['editor_font_size'] = self.editor_font_size.value()
+        if hasattr(self, 'output_font_combo'):
+            self.new_settings['output_font_family'] = self.output_font_combo.currentText()
+            self.new_settings['output_font_size'] = self.output_font_size.value()
         
         # Configuraciones del formatter (si existen los controles)
         if hasattr(self, 'formatter_enabled_checkbox'):
@@ -1894,32 +2421,74 @@ def calcular(precio,descuento):
             self.new_settings['formatter_auto_spacing'] = self.formatter_auto_spacing_checkbox.isChecked()
     
     def _accept_changes(self):
-        """Acepta y aplica los cambios"""
+        """Acepta los cambios; quien abrió el diálogo los aplica y guarda"""
         self._update_new_settings()
-        if hasattr(self.parent_editor, 'apply_preferences'):
-            # Aplicar y guardar permanentemente
-            self.parent_editor.apply_preferences(self.new_settings, preview=False)
+        # Invalidar los ejemplos formateados si cambió la configuración del formatter
+        if any(self.new_settings.get(key) != self.current_settings.get(key)
+               for key in self.new_settings if key.startswith('formatter_')):
+            self._FORMAT_SAMPLE_CACHE.clear()
         self.accept()
     
+    def has_unapplied_changes(self):
+        """Indica si las nuevas configuraciones aún no se han aplicado al editor (vista previa)"""
+        return self._settings_changed()
+    
     def get_new_settings(self):
         """Retorna las nuevas configuraciones"""
         return self.new_settings
-    
-    def keyPressEvent(self, event):
-        """Maneja eventos de teclado para cerrar con ESC"""
-        if event.key() == Qt.Key.Key_Escape:
-            self.reject()  # Cierra el diálogo
-        else:
-            super().keyPressEvent(event)
+
+
+@functools.lru_cache(maxsize=256)
+def _qcolor(hex_str):
+    """QColor compartido por color hexadecimal (solo se usa para copiar en formatos)"""
+    return QColor(hex_str)
+
+
+# Escáner de una sola pasada para el resaltado por línea (equivalente a los tokens
+# de Pygments que tienen formato); Pygments queda como respaldo ante errores.
+_SCANNER_KEYWORDS = [kw for kw in keyword.kwlist if kw not in ('and', 'or', 'not', 'in', 'is')]
+_SCANNER_BUILTINS = sorted(
+    name for name, obj in vars(builtins).items()
+    if not name.startswith('_') and name not in keyword.kwlist
+    and not (isinstance(obj, type) and issubclass(obj, BaseException))
+)
+_PY_SCANNER = re.compile(
+    r"(?P<com>#.*)"
+    r"|(?:\b[rRbBuUfF]{1,2})?(?P<str>" + r'"""(?:[^\\]|\\.)*?(?:"""|$)' + r"|'''(?:[^\\]|\\.)*?(?:'''|$)"
+    r'|"(?:[^"\\]|\\.)*(?:"|$)' + r"|'(?:[^'\\]|\\.)*(?:'|$))"
+    r"|(?P<decl>\b(?:def|class)\b)"
+    r"|(?P<kw>\b(?:" + "|".join(_SCANNER_KEYWORDS) + r")\b)"
+    r"|(?P<radix>\b0[xXoObB][0-9a-fA-F_]+)"
+    r"|(?P<num>\b\d[\d_]*(?:\.\d*)?(?:[eE][+-]?\d+)?|(?<![\w.])\.\d+(?:[eE][+-]?\d+)?)"
+    r"|(?<!\.)(?P<bi>\b(?:" + "|".join(_SCANNER_BUILTINS) + r")\b)"
+    r"|(?P<name>[A-Za-z_]\w*)"
+    r"|(?P<deco>^\s*@[\w.]+)"
+    r"|(?P<op>(?:[-+*/%=<>&|^~@.]|!=)+)"
+)
 
 
 class PythonSyntaxHighlighter(QSyntaxHighlighter):
     """Resaltador de sintaxis para Python usando Pygments"""
     
+    # Colores por defecto de cada tipo de token si el tema no los define
+    _SYNTAX_DEFAULTS = {
+        'keyword': '#FF6B35',
+        'string': '#2ECC71',
+        'comment': '#95A5A6',
+        'number': '#E74C3C',
+        'operator': '#9B59B6',
+        'builtin': '#3498DB',
+        'function': '#F39C12',
+        'class': '#E67E22',
+    }
+    
     def __init__(self, document, theme_settings=None):
         super().__init__(document)
         self.lexer = PythonLexer()
         self.formatter = NullFormatter()
+        # Caché por instancia de tramos del escáner por texto de línea; guarda claves de
+        # formato y no formatos, así que los cambios de tema no la invalidan
+        self._scan_spans = functools.lru_cache(maxsize=4096)(self._scan_spans_impl)
         self.theme_settings = theme_settings or self._get_default_theme()
         self._setup_formats()
     
@@ -1930,17 +2499,24 @@ class PythonSyntaxHighlighter(QSyntaxHighlighter):
     
     def update_theme(self, theme_settings):
         """Actualiza el tema del resaltador"""
-        self.theme_settings = theme_settings
+        # Mismo tema que el ya aplicado: los formatos y el resaltado actuales siguen valiendo
+        if theme_settings == self.theme_settings:
+            return
+        # Copia propia para que la comparación no dependa de cambios posteriores del llamador
+        self.theme_settings = copy.deepcopy(theme_settings)
         self._setup_formats()
         self.rehighlight()
     
     def _setup_formats(self):
         """Configura los formatos de colores para diferentes tipos de tokens"""
         self.formats = {}
+        theme = self.theme_settings
+        colors = {key: theme.get(f'syntax_{key}_color', default)
+                  for key, default in self._SYNTAX_DEFAULTS.items()}
         
         # Palabras clave (def, class, if, etc.)
         keyword_format = QTextCharFormat()
-        keyword_format.setForeground(QColor(self.theme_settings.get('syntax_keyword_color', '#FF6B35')))
+        keyword_format.setForeground(_qcolor(colors['keyword']))
         keyword_format.setFontWeight(QFont.Weight.Bold)
         self.formats[Token.Keyword] = keyword_format
         self.formats[Token.Keyword.Constant] = keyword_format
@@ -1950,7 +2526,7 @@ class PythonSyntaxHighlighter(QSyntaxHighlighter):
         
         # Strings
         string_format = QTextCharFormat()
-        string_format.setForeground(QColor(self.theme_settings.get('syntax_string_color', '#2ECC71')))
+        string_format.setForeground(_qcolor(colors['string']))
         self.formats[Token.Literal.String] = string_format
         self.formats[Token.Literal.String.Double] = string_format
         self.formats[Token.Literal.String.Single] = string_format
@@ -1958,7 +2534,7 @@ class PythonSyntaxHighlighter(QSyntaxHighlighter):
         
         # Comentarios
         comment_format = QTextCharFormat()
-        comment_format.setForeground(QColor(self.theme_settings.get('syntax_comment_color', '#95A5A6')))
+        comment_format.setForeground(_qcolor(colors['comment']))
         comment_format.setFontItalic(True)
         self.formats[Token.Comment] = comment_format
         self.formats[Token.Comment.Single] = comment_format
@@ -1966,40 +2542,88 @@ class PythonSyntaxHighlighter(QSyntaxHighlighter):
         
         # Números
         number_format = QTextCharFormat()
-        number_format.setForeground(QColor(self.theme_settings.get('syntax_number_color', '#E74C3C')))
+        number_format.setForeground(_qcolor(colors['number']))
         self.formats[Token.Literal.Number] = number_format
         self.formats[Token.Literal.Number.Integer] = number_format
         self.formats[Token.Literal.Number.Float] = number_format
         
         # Operadores
         operator_format = QTextCharFormat()
-        operator_format.setForeground(QColor(self.theme_settings.get('syntax_operator_color', '#9B59B6')))
+        operator_format.setForeground(_qcolor(colors['operator']))
         operator_format.setFontWeight(QFont.Weight.Bold)
         self.formats[Token.Operator] = operator_format
         
         # Funciones built-in
         builtin_format = QTextCharFormat()
-        builtin_format.setForeground(QColor(self.theme_settings.get('syntax_builtin_color', '#3498DB')))
+        builtin_format.setForeground(_qcolor(colors['builtin']))
         self.formats[Token.Name.Builtin] = builtin_format
         
         # Nombres de funciones
         function_format = QTextCharFormat()
-        function_format.setForeground(QColor(self.theme_settings.get('syntax_function_color', '#F39C12')))
+        function_format.setForeground(_qcolor(colors['function']))
         self.formats[Token.Name.Function] = function_format
         
         # Nombres de clases
         class_format = QTextCharFormat()
-        class_format.setForeground(QColor(self.theme_settings.get('syntax_class_color', '#E67E22')))
+        class_format.setForeground(_qcolor(colors['class']))
         class_format.setFontWeight(QFont.Weight.Bold)
         self.formats[Token.Name.Class] = class_format
+        
+        # Formatos por grupo del escáner
+        self._scanner_formats = {
+            'com': comment_format,
+            'str': string_format,
+            'decl': keyword_format,
+            'kw': keyword_format,
+            'num': number_format,
+            'bi': builtin_format,
+            'op': operator_format,
+            'func': function_format,  # nombre que sigue a def
+            'cls': class_format,  # nombre que sigue a class
+        }
     
     def highlightBlock(self, text):
         """Resalta un bloque de texto"""
         try:
-            tokens = list(self.lexer.get_tokens(text))
+            self._highlight_with_scanner(text)
+        except Exception:
+            self._highlight_with_pygments(text)
+    
+    def _highlight_with_scanner(self, text):
+        """Resalta la línea con los tramos del escáner precompilado (cacheados por texto)"""
+        set_format = self.setFormat
+        formats = self._scanner_formats
+        for start, length, key in self._scan_spans(text):
+            set_format(start, length, formats[key])
+    
+    def _scan_spans_impl(self, text):
+        """Recorre la línea una vez con el escáner y devuelve sus tramos (inicio, longitud, clave)"""
+        formats = self._scanner_formats
+        spans = []
+        pending = None  # clave de formato para el nombre que sigue a def/class
+        
+        for match in _PY_SCANNER.finditer(text):
+            group = match.lastgroup
+            if group == 'name':
+                if pending is not None and not match.group().startswith('__'):
+                    spans.append((match.start(), match.end() - match.start(), pending))
+                pending = None
+                continue
+            
+            pending = None
+            if group == 'decl':
+                pending = 'func' if match.group() == 'def' else 'cls'
+            if group in formats:
+                start, end = match.span(group)
+                spans.append((start, end - start, group))
+        return tuple(spans)
+    
+    def _highlight_with_pygments(self, text):
+        """Resalta la línea con los tokens de Pygments"""
+        try:
             index = 0
             
-            for token_type, token_text in tokens:
+            for token_type, token_text in self.lexer.get_tokens(text):
                 length = len(token_text)
                 format_obj = self.formats.get(token_type)
                 
@@ -2019,28 +2643,47 @@ class SyntaxHighlighterWithErrors(PythonSyntaxHighlighter):
     def __init__(self, document, theme_settings=None):
         super().__init__(document, theme_settings)
         self.syntax_errors = []
+        self._errors_by_line = {}
+        self._last_error_fingerprint = ()
         self._setup_error_formats()
     
     def _setup_error_formats(self):
         """Configura formatos para diferentes tipos de errores"""
         # Formato para errores
         self.error_format = QTextCharFormat()
-        self.error_format.setUnderlineColor(QColor("#E74C3C"))
+        self.error_format.setUnderlineColor(_qcolor("#E74C3C"))
         self.error_format.setUnderlineStyle(QTextCharFormat.UnderlineStyle.WaveUnderline)
         
         # Formato para advertencias
         self.warning_format = QTextCharFormat()
-        self.warning_format.setUnderlineColor(QColor("#F39C12"))
+        self.warning_format.setUnderlineColor(_qcolor("#F39C12"))
         self.warning_format.setUnderlineStyle(QTextCharFormat.UnderlineStyle.WaveUnderline)
         
         # Formato para información
         self.info_format = QTextCharFormat()
-        self.info_format.setUnderlineColor(QColor("#3498DB"))
+        self.info_format.setUnderlineColor(_qcolor("#3498DB"))
         self.info_format.setUnderlineStyle(QTextCharFormat.UnderlineStyle.DotLine)
+        
+        # Formato por tipo de error
+        self._error_format_by_type = {
+            'error': self.error_format,
+            'warning': self.warning_format,
+            'info': self.info_format,
+        }
     
     def set_syntax_errors(self, errors):
         """Establece los errores de sintaxis a mostrar"""
         self.syntax_errors = errors
+        # Índice por número de línea para no recorrer todos los errores en cada bloque
+        self._errors_by_line = {}
+        for error in errors:
+            self._errors_by_line.setdefault(error.line_number, []).append(error)
+        
+        # Solo volver a resaltar si cambian los subrayados (línea, columna, tipo)
+        fingerprint = tuple((e.line_number, e.column, e.error_type) for e in errors)
+        if fingerprint == self._last_error_fingerprint:
+            return
+        self._last_error_fingerprint = fingerprint
         self.rehighlight()
     
     def highlightBlock(self, text):
@@ -2052,34 +2695,201 @@ class SyntaxHighlighterWithErrors(PythonSyntaxHighlighter):
         current_block = self.currentBlock()
         block_number = current_block.blockNumber() + 1  # Las líneas empiezan en 1
         
-        for error in self.syntax_errors:
-            if error.line_number == block_number:
-                # Determinar formato según tipo de error
-                if error.error_type == "error":
-                    format_to_use = self.error_format
-                elif error.error_type == "warning":
-                    format_to_use = self.warning_format
-                else:  # info
-                    format_to_use = self.info_format
-                
-                # Aplicar formato a toda la línea o desde la columna específica
-                start_index = max(0, error.column)
-                length = len(text) - start_index
-                if length > 0:
-                    self.setFormat(start_index, length, format_to_use)
+        for error in self._errors_by_line.get(block_number, ()):
+            # Determinar formato según tipo de error (info por defecto)
+            format_to_use = self._error_format_by_type.get(error.error_type, self.info_format)
+            
+            # Aplicar formato a toda la línea o desde la columna específica
+            start_index = max(0, error.column)
+            length = len(text) - start_index
+            if length > 0:
+                self.setFormat(start_index, length, format_to_use)
     
-    def update_theme(self, theme_settings):
-        """Actualiza el tema del resaltador de sintaxis"""
-        self.theme_settings = theme_settings
-        # Reconfigurar formatos con nuevos colores de tema
-        self._setup_formats()
-        # Volver a resaltar todo el documento
-        self.rehighlight()
+
+
+# Icono del explorador por extensión (el resto usa 📄)
+_EXT_ICON = {
+    '.py': "🐍",
+    '.txt': "📄",
+    '.md': "📄",
+    '.json': "⚙️",
+    '.yaml': "⚙️",
+    '.yml': "⚙️",
+    '.ini': "🔧",
+    '.cfg': "🔧",
+}
+
+_SUPPORTED_EXTENSIONS = frozenset(ext.lower() for ext in AppConfig.SUPPORTED_EXTENSIONS)
+
+# Color de los archivos soportados, creado una sola vez (#3498DB)
+_SUPPORTED_FILE_BRUSH = QBrush(QColor(0x34, 0x98, 0xDB))
+
+
+def _file_extension(name):
+    """Extensión en minúsculas de un nombre de archivo (como os.path.splitext)"""
+    dot = name.rfind('.')
+    if dot <= 0 or not name[:dot].lstrip('.'):
+        return ''  # Sin punto o nombre oculto sin extensión (".bashrc")
+    return name[dot:].lower()
+
+
+def _scan_directory(directory_path, show_hidden):
+    """Lista un directorio como tuplas (nombre, ruta, es_directorio), carpetas primero"""
+    keyed = []
+    # scandir trae el tipo de cada entrada sin un stat adicional
+    with os.scandir(directory_path) as entries:
+        for entry in entries:
+            name = entry.name
+            if name.startswith('.') and not show_hidden:
+                continue
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            # La clave de orden va delante: directorios primero, luego por nombre
+            keyed.append((not is_dir, name.lower(), name, entry.path))
+    
+    keyed.sort()
+    return [(name, path, not is_file) for is_file, _, name, path in keyed]
+
+
+class DirectoryScanWorker(QThread):
+    """Hilo que lista un directorio del explorador sin bloquear la interfaz"""
+    
+    scan_finished = Signal(int, list)  # (id de la petición, entradas)
+    scan_failed = Signal(int, str)  # (id de la petición, texto a mostrar)
+    
+    def __init__(self, request_id, directory_path, show_hidden, parent=None):
+        super().__init__(parent)
+        self.request_id = request_id
+        self.directory_path = directory_path
+        self.show_hidden = show_hidden
+    
+    def run(self):
+        """Listar el directorio y emitir las entradas como datos planos"""
+        try:
+            entries = _scan_directory(self.directory_path, self.show_hidden)
+        except PermissionError:
+            self.scan_failed.emit(self.request_id, "❌ Sin permisos")
+            return
+        except Exception as e:
+            self.scan_failed.emit(self.request_id, f"❌ Error: {str(e)}")
+            return
+        if not self.isInterruptionRequested():
+            self.scan_finished.emit(self.request_id, entries)
+
+
+def _wait_for_threads(threads):
+    """Interrumpe y espera los hilos indicados para que Qt no los destruya en ejecución"""
+    for thread in list(threads):
+        thread.requestInterruption()
+        thread.wait()
+
+
+# Estilos del explorador de archivos
+_EXPLORER_QSS = """
+    QTreeWidget {
+        background-color: #2C3E50;
+        color: #ECF0F1;
+        border: 1px solid #34495E;
+        border-radius: 5px;
+        padding: 5px;
+        selection-background-color: #3498DB;
+        selection-color: white;
+        font-family: Consolas, monospace;
+        font-size: 11px;
+    }
+    QTreeWidget::item {
+        padding: 4px 8px;
+        border-bottom: 1px solid #34495E;
+        height: 24px;
+    }
+    QTreeWidget::item:hover {
+        background-color: #34495E;
+    }
+    QTreeWidget::item:selected {
+        background-color: #3498DB;
+        color: white;
+    }
+    QTreeWidget::branch:has-siblings {
+        border-image: url(none);
+        border: none;
+    }
+    QTreeWidget::branch:has-children {
+        border-image: url(none);
+        border: none;
+    }
+    QTreeWidget::branch:closed:has-children {
+        border-image: url(none);
+        border: none;
+        image: url(none);
+    }
+    QTreeWidget::branch:open:has-children {
+        border-image: url(none);
+        border: none;
+        image: url(none);
+    }
+"""
+_UP_BUTTON_QSS = """
+    QPushButton {
+        background-color: #3498DB;
+        color: white;
+        border: none;
+        border-radius: 15px;
+        font-weight: bold;
+    }
+    QPushButton:hover {
+        background-color: #2980B9;
+    }
+    QPushButton:disabled {
+        background-color: #7F8C8D;
+    }
+"""
+_PATH_LABEL_QSS = """
+    QLabel {
+        color: #ECF0F1;
+        font-weight: bold;
+        padding: 5px;
+    }
+"""
+_CHANGE_ROOT_BUTTON_QSS = """
+    QPushButton {
+        background-color: #27AE60;
+        color: white;
+        border: none;
+        border-radius: 15px;
+        font-weight: bold;
+    }
+    QPushButton:hover {
+        background-color: #229954;
+    }
+"""
+_EXPLORER_MENU_QSS = """
+    QMenu {
+        background-color: #2C3E50;
+        color: #ECF0F1;
+        border: 2px solid #3498DB;
+        border-radius: 5px;
+        padding: 5px;
+    }
+    QMenu::item {
+        padding: 8px 16px;
+        border-radius: 3px;
+    }
+    QMenu::item:selected {
+        background-color: #3498DB;
+        color: white;
+    }
+"""
 
 
 class FileExplorerWidget(QTreeWidget):
     """Widget explorador de archivos lateral con gestión completa de proyectos"""
     
+    LOADING_ROLE = Qt.ItemDataRole.UserRole + 1  # Marca de listado en curso
+    IS_DIR_ROLE = Qt.ItemDataRole.UserRole + 2  # La entrada es una carpeta
+    DIR_CACHE_SIZE = 64  # Listados de directorio recordados (validados por mtime)
+    
     def __init__(self, parent_editor=None):
         super().__init__()  # No pasar parent_editor como parent de QTreeWidget
         self.parent_editor = parent_editor
@@ -2096,56 +2906,35 @@ class FileExplorerWidget(QTreeWidget):
         # Variables de estado
         self.current_root_path = os.path.expanduser("~")  # Comenzar en directorio home
         
+        # Listados de directorios en segundo plano
+        self._scan_workers = set()  # hilos vivos (se descartan al terminar)
+        # Los hilos son hijos del explorador: si se destruye con un listado lento en curso,
+        # hay que esperarlos antes de que Qt los borre
+        self.destroyed.connect(functools.partial(_wait_for_threads, self._scan_workers))
+        self._scan_requests = {}  # id -> (item, generación del árbol, ruta, firma, es refresco)
+        self._scan_counter = 0
+        self._tree_generation = 0  # cambia al reconstruir el árbol; invalida listados pendientes
+        # ruta -> ((mtime_ns, tamaño, ocultos), entradas), en orden de uso reciente
+        self._dir_cache = OrderedDict()
+        # Vigila las carpetas ya listadas para reflejar cambios hechos fuera del explorador
+        self._watcher = QFileSystemWatcher(self)
+        self._watcher.directoryChanged.connect(self._on_directory_changed)
+        
         # Configurar estilo
-        self.setStyleSheet("""
-            QTreeWidget {
-                background-color: #2C3E50;
-                color: #ECF0F1;
-                border: 1px solid #34495E;
-                border-radius: 5px;
-                padding: 5px;
-                selection-background-color: #3498DB;
-                selection-color: white;
-                font-family: Consolas, monospace;
-                font-size: 11px;
-            }
-            QTreeWidget::item {
-                padding: 4px 8px;
-                border-bottom: 1px solid #34495E;
-                height: 24px;
-            }
-            QTreeWidget::item:hover {
-                background-color: #34495E;
-            }
-            QTreeWidget::item:selected {
-                background-color: #3498DB;
-                color: white;
-            }
-            QTreeWidget::branch:has-siblings {
-                border-image: url(none);
-                border: none;
-            }
-            QTreeWidget::branch:has-children {
-                border-image: url(none);
-                border: none;
-            }
-            QTreeWidget::branch:closed:has-children {
-                border-image: url(none);
-                border: none;
-                image: url(none);
-            }
-            QTreeWidget::branch:open:has-children {
-                border-image: url(none);
-                border: none;
-                image: url(none);
-            }
-        """)
+        self.setStyleSheet(_EXPLORER_QSS)
         
         # Crear barra de herramientas de navegación
         self.create_navigation_toolbar()
         
-        # Cargar el directorio inicial
-        self.load_directory(self.current_root_path)
+        # Cargar el directorio inicial cuando el explorador se muestre por primera vez
+        self._pending_load = True
+    
+    def showEvent(self, event):
+        """Carga el directorio inicial tras el primer pintado del explorador"""
+        if self._pending_load:
+            self._pending_load = False
+            QTimer.singleShot(0, lambda: self.load_directory(self.current_root_path))
+        super().showEvent(event)
     
     def create_navigation_toolbar(self):
         """Crea la barra de herramientas de navegación"""
@@ -2162,49 +2951,18 @@ class FileExplorerWidget(QTreeWidget):
             self.up_button.setFixedSize(30, 30)
             self.up_button.setToolTip("Subir al directorio padre")
             self.up_button.clicked.connect(self.navigate_up)
-            self.up_button.setStyleSheet("""
-                QPushButton {
-                    background-color: #3498DB;
-                    color: white;
-                    border: none;
-                    border-radius: 15px;
-                    font-weight: bold;
-                }
-                QPushButton:hover {
-                    background-color: #2980B9;
-                }
-                QPushButton:disabled {
-                    background-color: #7F8C8D;
-                }
-            """)
+            self.up_button.setStyleSheet(_UP_BUTTON_QSS)
             
             # Etiqueta de ruta actual
             self.path_label = QLabel("📁 Inicio")
-            self.path_label.setStyleSheet("""
-                QLabel {
-                    color: #ECF0F1;
-                    font-weight: bold;
-                    padding: 5px;
-                }
-            """)
+            self.path_label.setStyleSheet(_PATH_LABEL_QSS)
             
-            # Botón para cambiar directorio raíz
-            change_root_button = QPushButton("📂")
-            change_root_button.setFixedSize(30, 30)
-            change_root_button.setToolTip("Cambiar directorio raíz")
-            change_root_button.clicked.connect(self.change_root_directory)
-            change_root_button.setStyleSheet("""
-                QPushButton {
-                    background-color: #27AE60;
-                    color: white;
-                    border: none;
-                    border-radius: 15px;
-                    font-weight: bold;
-                }
-                QPushButton:hover {
-                    background-color: #229954;
-                }
-            """)
+            # Botón para cambiar directorio raíz
+            change_root_button = QPushButton("📂")
+            change_root_button.setFixedSize(30, 30)
+            change_root_button.setToolTip("Cambiar directorio raíz")
+            change_root_button.clicked.connect(self.change_root_directory)
+            change_root_button.setStyleSheet(_CHANGE_ROOT_BUTTON_QSS)
             
             toolbar_layout.addWidget(self.up_button)
             toolbar_layout.addWidget(self.path_label)
@@ -2213,9 +2971,17 @@ class FileExplorerWidget(QTreeWidget):
     
     def load_directory(self, path):
         """Carga un directorio en el explorador"""
+        self._pending_load = False
+        self._cancel_directory_scans()
+        watched = self._watcher.directories()
+        if watched:
+            self._watcher.removePaths(watched)
         self.clear()
         self.current_root_path = path
         self.current_directory = path  # Añadir para tracking de directorio actual
+        # Padre del directorio actual; en la raíz del sistema coincide con él
+        self._current_parent = os.path.dirname(path)
+        self._is_root = self._current_parent == path
         
         try:
             # Verificar que el directorio existe
@@ -2232,8 +2998,10 @@ class FileExplorerWidget(QTreeWidget):
             root_item.setData(0, Qt.ItemDataRole.UserRole, path)
             root_item.setExpanded(True)
             
-            # Cargar contenido del directorio
-            self._load_directory_contents(root_item, path)
+            # Cargar contenido del directorio en segundo plano
+            loading_item = QTreeWidgetItem(root_item)
+            loading_item.setText(0, "Cargando...")
+            self._load_directory_contents_async(root_item, path)
             
             # Seleccionar el item raíz
             self.setCurrentItem(root_item)
@@ -2252,59 +3020,267 @@ class FileExplorerWidget(QTreeWidget):
     
     def _load_directory_contents(self, parent_item, directory_path):
         """Carga el contenido de un directorio"""
+        signature, items = self._cached_listing(directory_path)
+        if items is None:
+            try:
+                items = _scan_directory(directory_path, self._should_show_hidden())
+            except PermissionError:
+                self._add_error_item(parent_item, "❌ Sin permisos")
+                return
+            self._store_listing(directory_path, signature, items)
+        self._populate_directory_item(parent_item, items)
+    
+    def _directory_signature(self, directory_path):
+        """Firma (mtime, tamaño, ocultos) que valida un listado guardado"""
         try:
-            items = []
-            # Obtener archivos y directorios
-            for item_name in os.listdir(directory_path):
-                if item_name.startswith('.') and not self._should_show_hidden():
-                    continue
-                
-                item_path = os.path.join(directory_path, item_name)
-                items.append((item_name, item_path))
-            
-            # Ordenar: directorios primero, luego archivos
-            items.sort(key=lambda x: (not os.path.isdir(x[1]), x[0].lower()))
-            
-            for item_name, item_path in items:
-                tree_item = QTreeWidgetItem(parent_item)
-                
-                if os.path.isdir(item_path):
-                    tree_item.setText(0, f"📁 {item_name}")
-                    tree_item.setData(0, Qt.ItemDataRole.UserRole, item_path)
-                    # Agregar un item dummy para mostrar que tiene hijos
-                    # Esto permite que aparezca el indicador de expansión
-                    try:
-                        sub_items = os.listdir(item_path)
-                        if sub_items:  # Si tiene contenido, agregar dummy
-                            dummy_item = QTreeWidgetItem(tree_item)
-                            dummy_item.setText(0, "Cargando...")
-                    except PermissionError:
-                        pass
-                else:
-                    # Determinar icono por extensión
-                    file_ext = os.path.splitext(item_name)[1].lower()
-                    if file_ext in ['.py']:
-                        icon = "🐍"
-                    elif file_ext in ['.txt', '.md']:
-                        icon = "📄"
-                    elif file_ext in ['.json', '.yaml', '.yml']:
-                        icon = "⚙️"
-                    elif file_ext in ['.ini', '.cfg']:
-                        icon = "🔧"
-                    else:
-                        icon = "📄"
-                    
-                    tree_item.setText(0, f"{icon} {item_name}")
-                    tree_item.setData(0, Qt.ItemDataRole.UserRole, item_path)
-                    
-                    # Resaltar archivos soportados
-                    if self._is_supported_file(item_path):
-                        tree_item.setForeground(0, QColor("#3498DB"))
+            st = os.stat(directory_path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size, self._should_show_hidden())
+    
+    def _cached_listing(self, directory_path):
+        """Devuelve (firma, entradas) del caché; entradas es None si no hay un listado válido"""
+        signature = self._directory_signature(directory_path)
+        cached = self._dir_cache.get(directory_path)
+        if signature is not None and cached is not None and cached[0] == signature:
+            self._dir_cache.move_to_end(directory_path)
+            return signature, cached[1]
+        return signature, None
+    
+    def _store_listing(self, directory_path, signature, items):
+        """Guarda un listado en el caché de directorios"""
+        if signature is None:
+            return
+        self._dir_cache[directory_path] = (signature, items)
+        self._dir_cache.move_to_end(directory_path)
+        while len(self._dir_cache) > self.DIR_CACHE_SIZE:
+            self._dir_cache.popitem(last=False)
+    
+    def _invalidate_directory(self, directory_path):
+        """Descarta el listado guardado de un directorio tras modificarlo"""
+        self._dir_cache.pop(directory_path, None)
+    
+    def _load_directory_contents_async(self, parent_item, directory_path):
+        """Lista un directorio en un hilo y rellena el item al terminar"""
+        signature, items = self._cached_listing(directory_path)
+        if items is not None:
+            # Listado sin cambios desde la última vez: no hace falta el hilo
+            parent_item.takeChildren()
+            self._fill_directory_item(parent_item, items)
+            return
         
-        except PermissionError:
-            error_item = QTreeWidgetItem(parent_item)
-            error_item.setText(0, "❌ Sin permisos")
-            error_item.setDisabled(True)
+        parent_item.setData(0, self.LOADING_ROLE, True)
+        self._start_directory_scan(parent_item, directory_path, signature)
+    
+    def _start_directory_scan(self, parent_item, directory_path, signature, refresh=False):
+        """Lanza el hilo que lista un directorio para un item del árbol"""
+        self._scan_counter += 1
+        request_id = self._scan_counter
+        self._scan_requests[request_id] = (parent_item, self._tree_generation, directory_path, signature, refresh)
+        
+        # Con el explorador como padre, Qt libera el hilo (deleteLater) y no el recolector
+        worker = DirectoryScanWorker(request_id, directory_path, self._should_show_hidden(), self)
+        worker.scan_finished.connect(self._on_directory_scanned)
+        worker.scan_failed.connect(self._on_directory_scan_failed)
+        worker.finished.connect(self._on_scan_worker_finished)
+        self._scan_workers.add(worker)
+        worker.start()
+    
+    def _on_scan_worker_finished(self):
+        """Libera un hilo de listado ya terminado"""
+        worker = self.sender()
+        self._scan_workers.discard(worker)
+        worker.deleteLater()
+    
+    def _take_scan_request(self, request_id):
+        """Obtiene el item de una petición de listado si sigue vigente"""
+        parent_item, generation, _, _, refresh = self._scan_requests.pop(request_id, (None,) * 5)
+        if parent_item is None or generation != self._tree_generation:
+            return None  # El árbol se reconstruyó mientras se listaba
+        if refresh:
+            return parent_item  # Se conservan los hijos actuales
+        try:
+            parent_item.setData(0, self.LOADING_ROLE, False)
+            parent_item.takeChildren()  # Quitar el item "Cargando..."
+        except RuntimeError:
+            return None  # El item ya no existe
+        return parent_item
+    
+    def _on_directory_scanned(self, request_id, items):
+        """Rellena el item con las entradas listadas en segundo plano"""
+        refresh = False
+        if request_id in self._scan_requests:
+            _, _, directory_path, signature, refresh = self._scan_requests[request_id]
+            self._store_listing(directory_path, signature, items)
+        parent_item = self._take_scan_request(request_id)
+        if parent_item is None:
+            return
+        try:
+            if refresh:
+                self._sync_directory_item(parent_item, items)
+            else:
+                self._fill_directory_item(parent_item, items)
+        except RuntimeError:
+            pass  # El item se eliminó mientras se listaba
+    
+    def _on_directory_changed(self, directory_path):
+        """Vuelve a listar una carpeta cargada que cambió en disco"""
+        self._invalidate_directory(directory_path)
+        item = self._find_item(directory_path)
+        if item is None or not self._is_loaded(item):
+            return  # Se listará de nuevo cuando se expanda
+        if os.path.isdir(directory_path):
+            self._start_directory_scan(item, directory_path,
+                                       self._directory_signature(directory_path), refresh=True)
+    
+    def _sync_directory_item(self, parent_item, items):
+        """Ajusta los hijos de un item al listado nuevo sin tocar los que no cambian"""
+        current = {}
+        for i in range(parent_item.childCount()):
+            child = parent_item.child(i)
+            child_path = child.data(0, Qt.ItemDataRole.UserRole)
+            if child_path:
+                current[child_path] = child
+        
+        listed = {item_path for _, item_path, _ in items}
+        for child_path, child in current.items():
+            if child_path not in listed:
+                parent_item.removeChild(child)
+        for item_name, item_path, is_dir in items:
+            if item_path not in current:
+                self._insert_child(parent_item, item_name, item_path, is_dir)
+    
+    def _fill_directory_item(self, parent_item, items):
+        """Rellena un item expandido con el listado de su directorio"""
+        self._populate_directory_item(parent_item, items)
+        directory_path = parent_item.data(0, Qt.ItemDataRole.UserRole)
+        if directory_path:
+            self._watcher.addPath(directory_path)
+        # Carpeta vacía: sin hijos desaparece el indicador de expansión
+        if not items and parent_item.parent() is not None:
+            parent_item.setExpanded(False)
+    
+    def _on_directory_scan_failed(self, request_id, message):
+        """Muestra el error de un listado en segundo plano"""
+        refresh = request_id in self._scan_requests and self._scan_requests[request_id][4]
+        parent_item = self._take_scan_request(request_id)
+        if parent_item is not None and not refresh:
+            self._add_error_item(parent_item, message)
+    
+    def _cancel_directory_scans(self):
+        """Invalida los listados pendientes antes de reconstruir el árbol"""
+        self._tree_generation += 1
+        self._scan_requests.clear()
+        for worker in self._scan_workers:
+            worker.requestInterruption()
+    
+    def shutdown_directory_scans(self):
+        """Cancela los listados en curso y espera a que terminen sus hilos"""
+        self._cancel_directory_scans()
+        _wait_for_threads(self._scan_workers)
+    
+    def _add_error_item(self, parent_item, message):
+        """Añade un item deshabilitado con un mensaje de error"""
+        error_item = QTreeWidgetItem(parent_item)
+        error_item.setText(0, message)
+        error_item.setDisabled(True)
+    
+    def _populate_directory_item(self, parent_item, items):
+        """Crea los items del árbol para las entradas de un directorio"""
+        children = [self._create_entry_item(item_name, item_path, is_dir)
+                    for item_name, item_path, is_dir in items]
+        # Un solo repintado para todo el listado en vez de uno por item
+        self.setUpdatesEnabled(False)
+        try:
+            parent_item.addChildren(children)
+        finally:
+            self.setUpdatesEnabled(True)
+    
+    def _create_entry_item(self, item_name, item_path, is_dir):
+        """Crea el item del árbol de un archivo o carpeta"""
+        tree_item = QTreeWidgetItem()
+        tree_item.setData(0, Qt.ItemDataRole.UserRole, item_path)
+        tree_item.setData(0, self.IS_DIR_ROLE, is_dir)
+        
+        if is_dir:
+            tree_item.setText(0, f"📁 {item_name}")
+            # Agregar un item dummy para mostrar el indicador de expansión;
+            # el contenido real se lee al expandir
+            dummy_item = QTreeWidgetItem(tree_item)
+            dummy_item.setText(0, "Cargando...")
+        else:
+            # Determinar icono por extensión
+            file_ext = _file_extension(item_name)
+            icon = _EXT_ICON.get(file_ext, "📄")
+            tree_item.setText(0, f"{icon} {item_name}")
+            
+            # Resaltar archivos soportados
+            if file_ext in _SUPPORTED_EXTENSIONS:
+                tree_item.setForeground(0, _SUPPORTED_FILE_BRUSH)
+        return tree_item
+    
+    def _find_item(self, path):
+        """Busca el item ya cargado de una ruta bajando desde la raíz del árbol"""
+        root_item = self.topLevelItem(0)
+        if root_item is None:
+            return None
+        root_path = root_item.data(0, Qt.ItemDataRole.UserRole)
+        if not root_path:
+            return None
+        if os.path.normpath(path) == os.path.normpath(root_path):
+            return root_item
+        
+        relative = os.path.relpath(path, root_path)
+        if relative.startswith(os.pardir):
+            return None
+        item = root_item
+        current = root_path
+        for part in relative.split(os.sep):
+            current = os.path.join(current, part)
+            for i in range(item.childCount()):
+                child = item.child(i)
+                if child.data(0, Qt.ItemDataRole.UserRole) == current:
+                    item = child
+                    break
+            else:
+                return None
+        return item
+    
+    def _is_loaded(self, item):
+        """Indica si el contenido de un item de carpeta ya está en el árbol"""
+        if item.data(0, self.LOADING_ROLE):
+            return False
+        return not (item.childCount() == 1 and item.child(0).text(0) == "Cargando...")
+    
+    def _insert_entry(self, path, is_dir):
+        """Añade una entrada nueva en su posición sin recargar el árbol"""
+        parent_item = self._find_item(os.path.dirname(path))
+        if parent_item is None or not self._is_loaded(parent_item):
+            return  # La carpeta no está cargada: se listará al expandirla
+        if self._find_item(path) is not None:
+            return  # Ya estaba en el árbol
+        self._insert_child(parent_item, os.path.basename(path), path, is_dir)
+    
+    def _insert_child(self, parent_item, name, path, is_dir):
+        """Inserta una entrada entre sus hermanas respetando el orden del listado"""
+        sibling_keys = []
+        for i in range(parent_item.childCount()):
+            child = parent_item.child(i)
+            child_path = child.data(0, Qt.ItemDataRole.UserRole) or ''
+            sibling_keys.append((not child.data(0, self.IS_DIR_ROLE), os.path.basename(child_path).lower()))
+        position = bisect.bisect_left(sibling_keys, (not is_dir, name.lower()))
+        parent_item.insertChild(position, self._create_entry_item(name, path, is_dir))
+    
+    def _remove_entry(self, path):
+        """Quita del árbol la entrada de una ruta eliminada"""
+        item = self._find_item(path)
+        if item is None:
+            return
+        parent_item = item.parent()
+        if parent_item is None:
+            self.load_directory(self.current_root_path)  # Se eliminó la raíz
+        else:
+            parent_item.removeChild(item)
     
     def _should_show_hidden(self):
         """Determina si mostrar archivos ocultos"""
@@ -2314,58 +3290,60 @@ class FileExplorerWidget(QTreeWidget):
         """Determina si auto-expandir directorios"""
         return getattr(self.parent_editor, 'auto_expand_dirs', False)
     
-    def _is_supported_file(self, file_path):
+    @staticmethod
+    def _is_supported_file(file_path):
         """Verifica si un archivo es soportado"""
-        from config import AppConfig
-        file_ext = os.path.splitext(file_path)[1].lower()
-        return file_ext in AppConfig.SUPPORTED_EXTENSIONS
+        return _file_extension(os.path.basename(file_path)) in _SUPPORTED_EXTENSIONS
+    
+    @staticmethod
+    def _path_mode(path):
+        """Modo de la ruta con un único stat (0 si no existe o no es válida)"""
+        try:
+            return os.stat(path).st_mode
+        except (OSError, TypeError, ValueError):
+            return 0
     
     def open_file(self, item):
         """Abre un archivo al hacer doble clic o navega a directorio"""
         file_path = item.data(0, Qt.ItemDataRole.UserRole)
-        print(f"🔍 open_file llamado con: {file_path}")  # Debug
+        log.debug("open_file llamado con: %s", file_path)
         
-        if os.path.isfile(file_path):
-            print(f"✅ Es un archivo válido")  # Debug
+        mode = self._path_mode(file_path)
+        if stat.S_ISREG(mode):
             if self._is_supported_file(file_path):
-                print(f"✅ Archivo soportado")  # Debug
                 # Abrir archivo en el editor
-                print(f"🔍 Intentando abrir archivo: {file_path}")  # Debug
                 if hasattr(self.parent_editor, 'load_file_content'):
-                    print("✅ Método load_file_content encontrado")  # Debug
                     result = self.parent_editor.load_file_content(file_path)
-                    if result:
-                        print("✅ Archivo cargado exitosamente")  # Debug
-                    else:
-                        print("❌ Error al cargar archivo")  # Debug
+                    if not result:
+                        log.debug("Error al cargar archivo: %s", file_path)
                 else:
-                    print("❌ Método load_file_content no encontrado")  # Debug
+                    log.debug("Método load_file_content no encontrado")
                     # Fallback: intentar abrir con el sistema
                     try:
                         QDesktopServices.openUrl(QUrl.fromLocalFile(file_path))
                     except Exception as e:
                         QMessageBox.warning(self, "Error", f"No se pudo abrir el archivo:\n{str(e)}")
             else:
-                print(f"❌ Archivo no soportado: {file_path}")  # Debug
-        elif os.path.isdir(file_path):
-            print(f"📁 Es un directorio, navegando...")  # Debug
+                log.debug("Archivo no soportado: %s", file_path)
+        elif stat.S_ISDIR(mode):
             # Para directorios, navegar dentro de la carpeta (cambiar directorio raíz)
             self.navigate_to_directory(file_path)
         else:
-            print(f"❌ Ruta no válida: {file_path}")  # Debug
+            log.debug("Ruta no válida: %s", file_path)
     
     def on_item_expanded(self, item):
         """Maneja la expansión de items para carga bajo demanda"""
         # Verificar si el primer hijo es un item dummy
         if item.childCount() == 1:
             first_child = item.child(0)
-            if first_child.text(0) == "Cargando...":
-                # Remover el item dummy
-                item.removeChild(first_child)
-                # Cargar el contenido real
+            if first_child.text(0) == "Cargando..." and not item.data(0, self.LOADING_ROLE):
+                # Cargar el contenido real en segundo plano; el dummy queda hasta entonces
                 file_path = item.data(0, Qt.ItemDataRole.UserRole)
                 if os.path.isdir(file_path):
-                    self._load_directory_contents(item, file_path)
+                    self._load_directory_contents_async(item, file_path)
+                else:
+                    item.removeChild(first_child)
+                    item.setExpanded(False)
     
     def keyPressEvent(self, event):
         """Maneja eventos de teclado para navegación mejorada"""
@@ -2379,7 +3357,7 @@ class FileExplorerWidget(QTreeWidget):
             # Flecha derecha para expandir carpeta
             if current_item and current_item.data(0, Qt.ItemDataRole.UserRole):
                 file_path = current_item.data(0, Qt.ItemDataRole.UserRole)
-                if os.path.isdir(file_path) and not current_item.isExpanded():
+                if not current_item.isExpanded() and stat.S_ISDIR(self._path_mode(file_path)):
                     if current_item.childCount() == 0:
                         self._load_directory_contents(current_item, file_path)
                     current_item.setExpanded(True)
@@ -2391,9 +3369,10 @@ class FileExplorerWidget(QTreeWidget):
             # F5 para actualizar
             if current_item:
                 file_path = current_item.data(0, Qt.ItemDataRole.UserRole)
-                if os.path.isdir(file_path):
-                    # Limpiar hijos y recargar
+                if stat.S_ISDIR(self._path_mode(file_path)):
+                    # Limpiar hijos y recargar desde disco
                     current_item.takeChildren()
+                    self._invalidate_directory(file_path)
                     self._load_directory_contents(current_item, file_path)
         else:
             # Para otras teclas, usar comportamiento por defecto
@@ -2404,28 +3383,13 @@ class FileExplorerWidget(QTreeWidget):
         item = self.itemAt(position)
         
         menu = QMenu(self)
-        menu.setStyleSheet("""
-            QMenu {
-                background-color: #2C3E50;
-                color: #ECF0F1;
-                border: 2px solid #3498DB;
-                border-radius: 5px;
-                padding: 5px;
-            }
-            QMenu::item {
-                padding: 8px 16px;
-                border-radius: 3px;
-            }
-            QMenu::item:selected {
-                background-color: #3498DB;
-                color: white;
-            }
-        """)
+        menu.setStyleSheet(_EXPLORER_MENU_QSS)
         
         if item:
             file_path = item.data(0, Qt.ItemDataRole.UserRole)
+            mode = self._path_mode(file_path)
             
-            if os.path.isfile(file_path):
+            if stat.S_ISREG(mode):
                 # Menú para archivos
                 open_action = menu.addAction("📖 Abrir archivo")
                 open_action.triggered.connect(lambda: self.open_file(item))
@@ -2434,7 +3398,7 @@ class FileExplorerWidget(QTreeWidget):
                 delete_action = menu.addAction("🗑️ Eliminar archivo")
                 delete_action.triggered.connect(lambda: self.delete_file(file_path))
                 
-            elif os.path.isdir(file_path):
+            elif stat.S_ISDIR(mode):
                 # Menú para directorios
                 new_file_action = menu.addAction("📄 Nuevo archivo...")
                 new_file_action.triggered.connect(lambda: self.create_new_file(file_path))
@@ -2483,7 +3447,8 @@ class FileExplorerWidget(QTreeWidget):
                         f.write('')
                 
                 # Actualizar explorador
-                self.load_directory(self.current_root_path)
+                self._invalidate_directory(directory_path)
+                self._insert_entry(file_path, False)
                 
                 # Abrir el archivo en el editor
                 if hasattr(self.parent_editor, 'load_file_content'):
@@ -2506,7 +3471,11 @@ class FileExplorerWidget(QTreeWidget):
             folder_path = os.path.join(directory_path, folder_name)
             try:
                 os.makedirs(folder_path, exist_ok=True)
-                self.load_directory(self.current_root_path)
+                self._invalidate_directory(directory_path)
+                # Con rutas anidadas ("a/b/c") solo cuelga del árbol la primera carpeta
+                top_name = os.path.relpath(folder_path, directory_path).split(os.sep, 1)[0]
+                if top_name not in (os.curdir, os.pardir):
+                    self._insert_entry(os.path.join(directory_path, top_name), True)
                 QMessageBox.information(self, "Éxito", f"Carpeta '{folder_name}' creada correctamente.")
             except Exception as e:
                 QMessageBox.critical(self, "Error", f"No se pudo crear la carpeta:\n{str(e)}")
@@ -2524,7 +3493,8 @@ class FileExplorerWidget(QTreeWidget):
         if reply == QMessageBox.StandardButton.Yes:
             try:
                 os.remove(file_path)
-                self.load_directory(self.current_root_path)
+                self._invalidate_directory(os.path.dirname(file_path))
+                self._remove_entry(file_path)
                 QMessageBox.information(self, "Éxito", "Archivo eliminado correctamente.")
             except Exception as e:
                 QMessageBox.critical(self, "Error", f"No se pudo eliminar el archivo:\n{str(e)}")
@@ -2543,7 +3513,9 @@ class FileExplorerWidget(QTreeWidget):
             try:
                 import shutil
                 shutil.rmtree(folder_path)
-                self.load_directory(self.current_root_path)
+                self._invalidate_directory(folder_path)
+                self._invalidate_directory(os.path.dirname(folder_path))
+                self._remove_entry(folder_path)
                 QMessageBox.information(self, "Éxito", "Carpeta eliminada correctamente.")
             except Exception as e:
                 QMessageBox.critical(self, "Error", f"No se pudo eliminar la carpeta:\n{str(e)}")
@@ -2552,7 +3524,8 @@ class FileExplorerWidget(QTreeWidget):
         """Actualiza un directorio específico"""
         # Limpiar hijos del item
         item.takeChildren()
-        # Recargar contenido
+        # Recargar contenido desde disco
+        self._invalidate_directory(directory_path)
         self._load_directory_contents(item, directory_path)
     
     def change_root_directory(self):
@@ -2569,22 +3542,15 @@ class FileExplorerWidget(QTreeWidget):
     def navigate_to_directory(self, directory_path):
         """Navega a un directorio específico y lo hace el nuevo directorio raíz"""
         if os.path.isdir(directory_path):
-            self.current_directory = directory_path
-            self.current_root_path = directory_path
+            # load_directory fija el directorio actual y actualiza la barra de navegación
             self.load_directory(directory_path)
-            
-            # Actualizar la barra de herramientas si existe
-            if hasattr(self, 'toolbar_widget'):
-                self.update_navigation_toolbar()
             return True
         return False
     
     def navigate_up(self):
         """Navega al directorio padre"""
-        if hasattr(self, 'current_directory') and self.current_directory:
-            parent_dir = os.path.dirname(self.current_directory)
-            if parent_dir != self.current_directory:  # Evitar bucle en raíz del sistema
-                self.navigate_to_directory(parent_dir)
+        if getattr(self, 'current_directory', None) and not self._is_root:  # Evitar bucle en raíz del sistema
+            self.navigate_to_directory(self._current_parent)
     
     def update_navigation_toolbar(self):
         """Actualiza la barra de herramientas de navegación"""
@@ -2595,8 +3561,33 @@ class FileExplorerWidget(QTreeWidget):
             
             # Habilitar/deshabilitar botón de subir según si estamos en la raíz
             if hasattr(self, 'up_button'):
-                parent_dir = os.path.dirname(self.current_directory)
-                self.up_button.setEnabled(parent_dir != self.current_directory)
+                self.up_button.setEnabled(not self._is_root)
+
+
+_AUTOCOMPLETE_QSS = """
+    QListWidget {
+        background-color: #2C3E50;
+        color: #ECF0F1;
+        border: 2px solid #3498DB;
+        border-radius: 5px;
+        padding: 2px;
+        selection-background-color: #3498DB;
+        selection-color: white;
+        font-family: Consolas, monospace;
+        font-size: 11px;
+    }
+    QListWidget::item {
+        padding: 4px 8px;
+        border-bottom: 1px solid #34495E;
+    }
+    QListWidget::item:hover {
+        background-color: #34495E;
+    }
+    QListWidget::item:selected {
+        background-color: #3498DB;
+        color: white;
+    }
+"""
 
 
 class AutoCompleteWidget(QListWidget):
@@ -2614,30 +3605,7 @@ class AutoCompleteWidget(QListWidget):
         self.itemClicked.connect(self.insert_completion)
         
         # Configurar estilo
-        self.setStyleSheet("""
-            QListWidget {
-                background-color: #2C3E50;
-                color: #ECF0F1;
-                border: 2px solid #3498DB;
-                border-radius: 5px;
-                padding: 2px;
-                selection-background-color: #3498DB;
-                selection-color: white;
-                font-family: Consolas, monospace;
-                font-size: 11px;
-            }
-            QListWidget::item {
-                padding: 4px 8px;
-                border-bottom: 1px solid #34495E;
-            }
-            QListWidget::item:hover {
-                background-color: #34495E;
-            }
-            QListWidget::item:selected {
-                background-color: #3498DB;
-                color: white;
-            }
-        """)
+        self.setStyleSheet(_AUTOCOMPLETE_QSS)
     
     def show_completions(self, completions, position):
         """Muestra las sugerencias de autocompletado"""
@@ -2679,7 +3647,7 @@ class AutoCompleteWidget(QListWidget):
     def keyPressEvent(self, event):
         """Maneja eventos de teclado en el widget de autocompletado"""
         if event.key() == Qt.Key.Key_Escape:
-            self.hide()
+            self.editor._ac_hide()
             self.editor.setFocus()
         elif event.key() == Qt.Key.Key_Return or event.key() == Qt.Key.Key_Enter:
             if self.currentItem():
@@ -2777,6 +3745,37 @@ class AutoCompleteManager:
             'abs': 'abs(x) - Valor absoluto de un número',
             'round': 'round(number, ndigits=0) - Redondea un número'
         }
+        
+        self._build_completion_index()
+    
+    def _build_completion_index(self):
+        """Precalcula las sugerencias ordenadas por texto para buscar prefijos con bisect"""
+        candidates = []
+        for snippet_key, snippet_info in self.snippets.items():
+            candidates.append((snippet_key, {
+                'text': snippet_key,
+                'type': 'snippet',
+                'description': snippet_info['description'],
+                'template': snippet_info.get('template', snippet_key)
+            }))
+        for kw in self.keywords:
+            candidates.append((kw, {
+                'text': kw,
+                'type': 'keyword',
+                'description': 'Palabra clave de Python'
+            }))
+        for builtin in self.builtins:
+            candidates.append((builtin, {
+                'text': builtin,
+                'type': 'builtin',
+                'description': self.function_docs.get(builtin, 'Función built-in de Python')
+            }))
+        
+        # (texto, orden original, sugerencia); el orden original desempata como antes
+        self._completion_index = sorted(
+            (key, seq, completion) for seq, (key, completion) in enumerate(candidates)
+        )
+        self._completion_keys = [entry[0] for entry in self._completion_index]
     
     def get_completions(self, text, cursor_position):
         """Obtiene las sugerencias de autocompletado para el texto actual"""
@@ -2794,44 +3793,20 @@ class AutoCompleteManager:
         if len(current_word) < 1:  # Mínimo 1 carácter para activar autocompletado
             return []
         
-        completions = []
-        
-        # Snippets (prioridad alta)
-        for snippet_key, snippet_info in self.snippets.items():
-            if snippet_key.startswith(current_word):
-                completions.append({
-                    'text': snippet_key,
-                    'type': 'snippet',
-                    'description': snippet_info['description'],
-                    'template': snippet_info.get('template', snippet_key)
-                })
-        
-        # Palabras clave
-        for kw in self.keywords:
-            if kw.startswith(current_word):
-                completions.append({
-                    'text': kw,
-                    'type': 'keyword',
-                    'description': 'Palabra clave de Python'
-                })
-        
-        # Funciones built-in
-        for builtin in self.builtins:
-            if builtin.startswith(current_word):
-                doc = self.function_docs.get(builtin, 'Función built-in de Python')
-                completions.append({
-                    'text': builtin,
-                    'type': 'builtin',
-                    'description': doc
-                })
+        # Rango de sugerencias que empiezan por la palabra (búsqueda binaria)
+        lo = bisect.bisect_left(self._completion_keys, current_word)
+        hi = bisect.bisect_left(self._completion_keys, current_word + '\uffff', lo)
+        matches = self._completion_index[lo:hi]
         
         # Ordenar por relevancia (snippets primero, luego por longitud)
-        completions.sort(key=lambda x: (
-            0 if x['type'] == 'snippet' else 1,
-            len(x['text'])
+        matches.sort(key=lambda entry: (
+            0 if entry[2]['type'] == 'snippet' else 1,
+            len(entry[0]),
+            entry[1]
         ))
         
-        return completions[:10]  # Limitar a 10 sugerencias
+        completions = [entry[2] for entry in matches[:10]]
+        return completions  # Limitado a 10 sugerencias
 
 
 class LineNumberArea(QWidget):
@@ -2850,9 +3825,34 @@ class LineNumberArea(QWidget):
         self.codeEditor.lineNumberAreaPaintEvent(event)
 
 
+# Estilo compartido por todos los editores de código
+_EDITOR_QSS = """
+    QPlainTextEdit {
+        background-color: #2C3E50;
+        color: #ECF0F1;
+        border: 2px solid #34495E;
+        border-radius: 5px;
+        padding: 10px;
+        line-height: 1.2;
+        selection-background-color: #3498DB;
+    }
+"""
+
+# Placeholders de snippet "${n:texto}"; el grupo es el texto por defecto
+_SNIPPET_PLACEHOLDER_RE = re.compile(r'\$\{\d+:([^}]*)\}')
+
+
 class PythonCodeEditor(QPlainTextEdit):
     """Editor de código especializado para Python con indentación automática y numeración de líneas"""
     
+    # Líneas terminadas en ':' que abren un bloque: palabra clave que requiere indentación,
+    # o estructuras comunes como "variable = ...:" o "funcion(...):"
+    _INDENT_RE = re.compile(
+        r'(?=.*:$)'
+        r'(?:(?:async\s+def|if|elif|else|for|while|with|try|except|finally|def|class|match|case)[ :]'
+        r'|(?=.*=)|(?=.*\()(?=.*\)))'
+    )
+    
     def __init__(self, parent=None):
         super().__init__(parent)
         
@@ -2862,82 +3862,91 @@ class PythonCodeEditor(QPlainTextEdit):
         
         # Área de numeración de líneas
         self.lineNumberArea = LineNumberArea(self)
+        self._cached_line_area_width = -1
+        self._cached_block_count_digits = -1
+        self._line_height = self.fontMetrics().height()
+        self._digit_advance = self.fontMetrics().horizontalAdvance('9')
         
         # Sistema de autocompletado
         self.autocomplete_widget = AutoCompleteWidget(self)
         self.autocomplete_manager = AutoCompleteManager()
         
         # Conectar señales para actualizar la numeración
+        # updateRequest indica la franja del viewport que cambió (o el desplazamiento dy)
         self.document().blockCountChanged.connect(self.updateLineNumberAreaWidth)
-        self.verticalScrollBar().valueChanged.connect(self.updateLineNumberArea)
-        self.textChanged.connect(self.updateLineNumberArea)
-        self.cursorPositionChanged.connect(self.updateLineNumberArea)
+        self.updateRequest.connect(self.updateLineNumberArea)
         
-        # Conectar señal para autocompletado
+        # Conectar señal para autocompletado (con debounce para ráfagas de teclas y pegados)
+        self._ac_timer = QTimer(self)
+        self._ac_timer.setSingleShot(True)
+        self._ac_timer.setInterval(100)
+        self._ac_timer.timeout.connect(self._do_autocomplete)
         self.textChanged.connect(self.on_text_changed)
         
         # Sistema de verificación de sintaxis en tiempo real
         self.syntax_checker = SyntaxChecker()
         self.syntax_checker.errors_found.connect(self.update_syntax_errors)
+        self.syntax_checker.finished.connect(self._on_syntax_check_finished)
+        self._last_code_hash = None  # Hash del último código enviado a verificar
         
         # Timer para verificación de sintaxis con debounce
         self.syntax_check_timer = QTimer()
         self.syntax_check_timer.setSingleShot(True)
         self.syntax_check_timer.timeout.connect(self.check_syntax)
-        self.syntax_check_timer.setInterval(1000)  # 1 segundo de delay
+        self.syntax_check_timer.setInterval(1500)  # 1,5 segundos de delay
+        self._last_debounce_ts = 0.0  # Último reinicio del timer (time.monotonic)
         
         # Conectar textChanged para verificación de sintaxis
         self.textChanged.connect(self.on_text_changed_syntax)
         
         # Lista de errores de sintaxis actuales
         self.current_syntax_errors = []
+        self._tooltip_by_line = {}  # línea -> texto del tooltip con sus errores, ya formateado
+        self._last_hover_line = -1  # Línea bajo el ratón en el último tooltip procesado
         
         # Configurar ancho inicial del área de numeración
         self.updateLineNumberAreaWidth(0)
         
-        # Palabras clave que requieren indentación
-        self.indent_keywords = {
-            'if', 'elif', 'else', 'for', 'while', 'with', 'try', 'except', 
-            'finally', 'def', 'class', 'async def', 'match', 'case'
-        }
-        
         # Configurar estilo
-        self.setStyleSheet("""
-            QPlainTextEdit {
-                background-color: #2C3E50;
-                color: #ECF0F1;
-                border: 2px solid #34495E;
-                border-radius: 5px;
-                padding: 10px;
-                line-height: 1.2;
-                selection-background-color: #3498DB;
-            }
-        """)
+        self.setStyleSheet(_EDITOR_QSS)
     
     def lineNumberAreaWidth(self):
         """Calcula el ancho necesario para el área de numeración"""
-        digits = 1
-        count = max(1, self.document().blockCount())
-        while count >= 10:
-            count /= 10
-            digits += 1
-        space = 3 + self.fontMetrics().horizontalAdvance('9') * digits
-        return space
+        # El ancho solo cambia cuando el número de líneas gana o pierde un dígito
+        digits = len(str(max(1, self.document().blockCount())))
+        if digits != self._cached_block_count_digits:
+            self._cached_block_count_digits = digits
+            self._cached_line_area_width = 3 + self._digit_advance * digits
+        return self._cached_line_area_width
     
     def updateLineNumberAreaWidth(self, newBlockCount):
         """Actualiza el ancho del área de numeración"""
-        self.setViewportMargins(self.lineNumberAreaWidth(), 0, 0, 0)
+        width = self.lineNumberAreaWidth()
+        if width != self.viewportMargins().left():
+            self.setViewportMargins(width, 0, 0, 0)  # Recoloca el viewport: solo si cambia
+        # Las líneas siguientes se renumeran aunque el cursor no se mueva
+        self.lineNumberArea.update()
+    
+    def changeEvent(self, event):
+        """Invalida el ancho cacheado de la numeración al cambiar la fuente"""
+        if event.type() == QEvent.Type.FontChange and hasattr(self, 'lineNumberArea'):
+            self._cached_block_count_digits = -1
+            self._line_height = self.fontMetrics().height()
+            self._digit_advance = self.fontMetrics().horizontalAdvance('9')
+            self.updateLineNumberAreaWidth(0)
+        super().changeEvent(event)
     
     def updateLineNumberArea(self, rect=None, dy=0):
         """Actualiza el área de numeración cuando cambia el contenido"""
         if dy:
             self.lineNumberArea.scroll(0, dy)
+        elif rect is not None:
+            # Repintar solo la franja vertical que cambió
+            self.lineNumberArea.update(0, rect.y(), self.lineNumberArea.width(), rect.height())
         else:
-            self.lineNumberArea.update(0, rect.y() if rect else 0, 
-                                     self.lineNumberArea.width(), 
-                                     rect.height() if rect else self.lineNumberArea.height())
+            self.lineNumberArea.update()
         
-        if rect and rect.contains(self.viewport().rect()):
+        if rect is not None and rect.contains(self.viewport().rect()):
             self.updateLineNumberAreaWidth(0)
     
     def resizeEvent(self, event):
@@ -2973,60 +3982,84 @@ class PythonCodeEditor(QPlainTextEdit):
         top = self.blockBoundingGeometry(block).translated(self.contentOffset()).top()
         bottom = top + self.blockBoundingRect(block).height()
         
-        # Altura de línea
-        height = self.fontMetrics().height()
+        # Altura de línea y límites de la zona a repintar
+        height = self._line_height
+        text_width = self.lineNumberArea.width() - 3
+        paint_top = event.rect().top()
+        paint_bottom = event.rect().bottom()
         
-        # Dibujar números de línea
-        while block.isValid() and (top <= event.rect().bottom()):
-            if block.isVisible() and (bottom >= event.rect().top()):
-                number = str(blockNumber + 1)
-                painter.drawText(0, int(top), self.lineNumberArea.width() - 3, height,
-                               Qt.AlignmentFlag.AlignRight, number)
+        # Dibujar números de línea (solo los bloques que cortan la zona a repintar)
+        while block.isValid() and (top <= paint_bottom):
+            if block.isVisible() and (bottom >= paint_top):
+                painter.drawText(0, int(top), text_width, height,
+                               Qt.AlignmentFlag.AlignRight, str(blockNumber + 1))
             
             block = block.next()
             top = bottom
             bottom = top + self.blockBoundingRect(block).height()
             blockNumber += 1
     
+    def _ac_hide(self):
+        """Cierra la lista de autocompletado"""
+        # Descartar el cálculo pendiente para que la lista no se vuelva a abrir sola
+        self._ac_timer.stop()
+        self.autocomplete_widget.hide()
+    
+    def _ac_accept(self):
+        """Inserta la sugerencia seleccionada en la lista de autocompletado"""
+        if self.autocomplete_widget.currentItem():
+            self.autocomplete_widget.insert_completion(self.autocomplete_widget.currentItem())
+    
+    def _ac_next(self):
+        """Selecciona la siguiente sugerencia"""
+        current_row = self.autocomplete_widget.currentRow()
+        if current_row < self.autocomplete_widget.count() - 1:
+            self.autocomplete_widget.setCurrentRow(current_row + 1)
+    
+    def _ac_prev(self):
+        """Selecciona la sugerencia anterior"""
+        current_row = self.autocomplete_widget.currentRow()
+        if current_row > 0:
+            self.autocomplete_widget.setCurrentRow(current_row - 1)
+    
+    # Letras, dígitos y '_' al final del texto: la palabra que se está escribiendo
+    _WORD_END_RE = re.compile(r'\w*$')
+    
+    # Teclas que consume la lista de autocompletado cuando está visible
+    _AC_HANDLERS = {
+        Qt.Key.Key_Escape: _ac_hide,
+        Qt.Key.Key_Return: _ac_accept,
+        Qt.Key.Key_Enter: _ac_accept,
+        Qt.Key.Key_Tab: _ac_accept,
+        Qt.Key.Key_Down: _ac_next,
+        Qt.Key.Key_Up: _ac_prev,
+    }
+    
     def keyPressEvent(self, event):
         """Maneja eventos de teclado incluyendo autocompletado e indentación automática"""
+        key = event.key()
+        
         # Si el widget de autocompletado está visible, manejar navegación
         if self.autocomplete_widget.isVisible():
-            if event.key() == Qt.Key.Key_Escape:
-                self.autocomplete_widget.hide()
-                return
-            elif event.key() == Qt.Key.Key_Return or event.key() == Qt.Key.Key_Enter:
-                if self.autocomplete_widget.currentItem():
-                    self.autocomplete_widget.insert_completion(self.autocomplete_widget.currentItem())
-                return
-            elif event.key() == Qt.Key.Key_Tab:
-                if self.autocomplete_widget.currentItem():
-                    self.autocomplete_widget.insert_completion(self.autocomplete_widget.currentItem())
-                return
-            elif event.key() == Qt.Key.Key_Down:
-                current_row = self.autocomplete_widget.currentRow()
-                if current_row < self.autocomplete_widget.count() - 1:
-                    self.autocomplete_widget.setCurrentRow(current_row + 1)
-                return
-            elif event.key() == Qt.Key.Key_Up:
-                current_row = self.autocomplete_widget.currentRow()
-                if current_row > 0:
-                    self.autocomplete_widget.setCurrentRow(current_row - 1)
+            handler = self._AC_HANDLERS.get(key)
+            if handler is not None:
+                handler(self)
                 return
         
         # Manejar indentación automática
-        if event.key() == Qt.Key.Key_Return or event.key() == Qt.Key.Key_Enter:
+        if key == Qt.Key.Key_Return or key == Qt.Key.Key_Enter:
             self.autocomplete_widget.hide()
             self._handle_enter_key()
-        elif event.key() == Qt.Key.Key_Tab:
+        elif key == Qt.Key.Key_Tab:
             if not self.autocomplete_widget.isVisible():
                 self._handle_tab_key()
-        elif event.key() == Qt.Key.Key_Backtab:  # Shift+Tab
+        elif key == Qt.Key.Key_Backtab:  # Shift+Tab
             self.autocomplete_widget.hide()
             self._handle_shift_tab_key()
         else:
             # Para otras teclas, ocultar autocompletado si no es una letra/número
-            if not (event.text().isalnum() or event.text() == '_'):
+            text = event.text()
+            if not (text.isalnum() or text == '_'):
                 self.autocomplete_widget.hide()
             super().keyPressEvent(event)
     
@@ -3043,21 +4076,7 @@ class PythonCodeEditor(QPlainTextEdit):
         
         # Verificar si la línea anterior requiere indentación adicional
         stripped_line = current_line.strip()
-        needs_extra_indent = False
-        
-        if stripped_line.endswith(':'):
-            # Verificar si es una palabra clave que requiere indentación
-            for keyword in self.indent_keywords:
-                if stripped_line.startswith(keyword + ' ') or stripped_line.startswith(keyword + ':'):
-                    needs_extra_indent = True
-                    break
-            
-            # También indentar para otras estructuras que terminen en ':'
-            if not needs_extra_indent:
-                # Buscar patrones comunes como "variable:" o "function():"
-                if ('=' in stripped_line and stripped_line.endswith(':')) or \
-                   ('(' in stripped_line and ')' in stripped_line and stripped_line.endswith(':')):
-                    needs_extra_indent = True
+        needs_extra_indent = self._INDENT_RE.match(stripped_line) is not None
         
         # Aplicar indentación
         if needs_extra_indent:
@@ -3103,14 +4122,12 @@ class PythonCodeEditor(QPlainTextEdit):
         cursor.setPosition(end)
         end_block = cursor.blockNumber()
         
-        # Procesar cada línea
+        # Procesar cada línea recorriendo los bloques una sola vez hacia delante
+        block = self.document().findBlockByNumber(start_block)
         cursor.beginEditBlock()
-        for block_num in range(start_block, end_block + 1):
-            cursor.movePosition(cursor.MoveOperation.Start)
-            for _ in range(block_num):
-                cursor.movePosition(cursor.MoveOperation.NextBlock)
-            
-            cursor.movePosition(cursor.MoveOperation.StartOfLine)
+        for _ in range(end_block - start_block + 1):
+            cursor.setPosition(block.position())
+            block = block.next()
             
             if indent:
                 cursor.insertText('    ')
@@ -3152,18 +4169,16 @@ class PythonCodeEditor(QPlainTextEdit):
     
     def _get_line_indent(self, line):
         """Obtiene la indentación de una línea"""
-        indent = ''
-        for char in line:
-            if char == ' ':
-                indent += char
-            elif char == '\t':
-                indent += '    '  # Convertir tabs a 4 espacios
-            else:
-                break
-        return indent
+        prefix = line[:len(line) - len(line.lstrip(' \t'))]
+        return prefix.replace('\t', '    ')  # Convertir tabs a 4 espacios
     
     def on_text_changed(self):
         """Maneja cambios en el texto para mostrar autocompletado"""
+        # Reiniciar el timer: solo se calculan completions al dejar de escribir
+        self._ac_timer.start()
+    
+    def _do_autocomplete(self):
+        """Calcula y muestra las completions para la posición actual del cursor"""
         try:
             cursor = self.textCursor()
             text = self.toPlainText()
@@ -3197,13 +4212,12 @@ class PythonCodeEditor(QPlainTextEdit):
     def insert_completion(self, completion_text):
         """Inserta una completion en el editor"""
         cursor = self.textCursor()
-        text = self.toPlainText()
         cursor_position = cursor.position()
         
-        # Encontrar el inicio de la palabra actual
-        word_start = cursor_position
-        while word_start > 0 and (text[word_start - 1].isalnum() or text[word_start - 1] == '_'):
-            word_start -= 1
+        # Encontrar el inicio de la palabra actual (basta con la línea del cursor)
+        column = cursor.positionInBlock()
+        match = self._WORD_END_RE.search(cursor.block().text(), 0, column)
+        word_start = cursor_position - (column - match.start())
         
         # Seleccionar la palabra actual para reemplazarla
         cursor.setPosition(word_start)
@@ -3215,9 +4229,8 @@ class PythonCodeEditor(QPlainTextEdit):
             if snippet_info and 'template' in snippet_info:
                 # Insertar template del snippet
                 template = snippet_info['template']
-                # Simplificar template eliminando placeholders por ahora
-                simplified_template = template.replace('${1:', '').replace('${2:', '').replace('${3:', '')
-                simplified_template = simplified_template.replace('}', '')
+                # Simplificar template dejando el texto por defecto de cada placeholder
+                simplified_template = _SNIPPET_PLACEHOLDER_RE.sub(r'\1', template)
                 cursor.insertText(simplified_template)
             else:
                 cursor.insertText(completion_text)
@@ -3225,24 +4238,51 @@ class PythonCodeEditor(QPlainTextEdit):
             cursor.insertText(completion_text)
         
         self.setTextCursor(cursor)
+        # La inserción cambia el texto y reinicia el timer: no volver a sugerir la palabra aceptada
+        self._ac_timer.stop()
     
     def on_text_changed_syntax(self):
         """Maneja cambios en el texto para verificación de sintaxis"""
-        # Reiniciar el timer para verificación
-        self.syntax_check_timer.stop()
-        self.syntax_check_timer.start()
+        # Reiniciar el timer para verificación; en ráfagas (pegados) basta un reinicio cada 100 ms
+        now = time.monotonic()
+        if now - self._last_debounce_ts < 0.1 and self.syntax_check_timer.isActive():
+            return
+        self._last_debounce_ts = now
+        self.syntax_check_timer.start()  # start() ya reinicia la cuenta atrás
     
     def check_syntax(self):
         """Inicia la verificación de sintaxis en el hilo separado"""
         code = self.toPlainText()
         if code.strip():  # Solo verificar si hay código
-            self.syntax_checker.set_code(code)
+            code_hash = hashlib.sha256(code.encode('utf-8')).digest()
+            if code_hash == self._last_code_hash:
+                return  # Mismo código que la última verificación: los errores siguen vigentes
+            self._last_code_hash = code_hash
+            self.syntax_checker.set_code(code, code_hash)
             if not self.syntax_checker.isRunning():
                 self.syntax_checker.start()
     
+    def _on_syntax_check_finished(self):
+        """Relanza el hilo si llegó código justo cuando terminaba su bucle"""
+        if self.syntax_checker.should_check:
+            self.syntax_checker.start()
+    
     def update_syntax_errors(self, errors):
         """Actualiza los errores de sintaxis encontrados"""
         self.current_syntax_errors = errors
+        errors_by_line = {}
+        for error in errors:
+            errors_by_line.setdefault(error.line_number, []).append(error)
+        # Los textos de los tooltips se forman una vez por verificación, no en cada movimiento
+        self._tooltip_by_line = {
+            line: "\n\n".join(
+                f"[{error.error_type.upper()}] {error.message}"
+                + (f"\nSugerencia: {error.suggestion}" if error.suggestion else "")
+                for error in line_errors
+            )
+            for line, line_errors in errors_by_line.items()
+        }
+        self._last_hover_line = -1  # El tooltip de la línea actual puede haber cambiado
         
         # Si el editor tiene un resaltador de sintaxis con errores, actualizarlo
         if hasattr(self, 'syntax_highlighter') and isinstance(self.syntax_highlighter, SyntaxHighlighterWithErrors):
@@ -3252,35 +4292,90 @@ class PythonCodeEditor(QPlainTextEdit):
         """Maneja eventos de movimiento del mouse para mostrar tooltips de errores"""
         super().mouseMoveEvent(event)
         
+        # Sin errores no hay tooltip que mostrar: evitar la búsqueda en el layout
+        if not self._tooltip_by_line:
+            if self._last_hover_line != -1:
+                self._last_hover_line = -1
+                QToolTip.hideText()
+            return
+        
         # Obtener posición del cursor en el texto
         cursor = self.cursorForPosition(event.pos())
         line_number = cursor.blockNumber() + 1
+        if line_number == self._last_hover_line:
+            return  # Misma línea: el tooltip ya está mostrado u oculto
+        self._last_hover_line = line_number
         
-        # Buscar errores en esta línea
-        errors_in_line = [error for error in self.current_syntax_errors if error.line_number == line_number]
-        
-        if errors_in_line:
-            # Mostrar tooltip con los errores
-            error_messages = []
-            for error in errors_in_line:
-                message = f"[{error.error_type.upper()}] {error.message}"
-                if error.suggestion:
-                    message += f"\nSugerencia: {error.suggestion}"
-                error_messages.append(message)
-            
-            tooltip_text = "\n\n".join(error_messages)
+        # Mostrar el tooltip ya formateado de los errores de esta línea
+        tooltip_text = self._tooltip_by_line.get(line_number)
+        if tooltip_text:
             QToolTip.showText(event.globalPos(), tooltip_text, self)
         else:
             QToolTip.hideText()
 
 
+def _read_source_file(file_path):
+    """Lee un archivo de texto UTF-8 para abrirlo en el editor"""
+    if os.path.getsize(file_path) <= AppConfig.EDITOR_MMAP_THRESHOLD:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return f.read()
+    
+    # Archivos grandes: decodificar directamente las páginas mapeadas, sin una copia
+    # intermedia en bytes. Se normalizan los saltos de línea como en modo texto
+    with open(file_path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            has_cr = mm.find(b'\r') != -1
+            text = str(mm, 'utf-8')
+    if has_cr:
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+    return text
+
+
 class TabData:
     """Clase para almacenar información de cada pestaña"""
     def __init__(self, file_path=None, content="", is_modified=False):
         self.file_path = file_path
         self.content = content
         self.is_modified = is_modified
-        self.original_content = content  # Para detectar cambios
+    
+    @property
+    def file_path(self):
+        """Ruta del archivo de la pestaña"""
+        return self._file_path
+    
+    @file_path.setter
+    def file_path(self, file_path):
+        self._file_path = file_path
+        # Nombre para el título, calculado una vez al asignar la ruta y no en cada tecla
+        self.basename = os.path.basename(file_path) if file_path else None
+
+
+_TABS_QSS = """
+    QTabWidget::pane {
+        border: 1px solid #34495E;
+        background-color: #2C3E50;
+    }
+    QTabWidget::tab-bar {
+        left: 5px;
+    }
+    QTabBar::tab {
+        background-color: #34495E;
+        color: #ECF0F1;
+        padding: 8px 16px;
+        margin-right: 2px;
+        border-top-left-radius: 4px;
+        border-top-right-radius: 4px;
+        min-width: 100px;
+    }
+    QTabBar::tab:selected {
+        background-color: #3498DB;
+        color: white;
+        font-weight: bold;
+    }
+    QTabBar::tab:hover {
+        background-color: #5DADE2;
+    }
+"""
 
 
 class TabbedCodeEditor(QTabWidget):
@@ -3289,7 +4384,8 @@ class TabbedCodeEditor(QTabWidget):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.parent_editor = parent
-        self.tab_data = {}  # Diccionario para almacenar datos de cada pestaña
+        self.tab_data = []  # Datos de cada pestaña, alineados con los índices de las pestañas
+        self._path_to_editor = {}  # Ruta de archivo -> editor de la pestaña que lo tiene abierto
         
         # Configurar el widget de pestañas
         self.setTabsClosable(True)
@@ -3302,34 +4398,10 @@ class TabbedCodeEditor(QTabWidget):
         # Conectar señales
         self.tabCloseRequested.connect(self.close_tab)
         self.currentChanged.connect(self.on_tab_changed)
+        self.tabBar().tabMoved.connect(self.on_tab_moved)
         
         # Configurar estilo
-        self.setStyleSheet("""
-            QTabWidget::pane {
-                border: 1px solid #34495E;
-                background-color: #2C3E50;
-            }
-            QTabWidget::tab-bar {
-                left: 5px;
-            }
-            QTabBar::tab {
-                background-color: #34495E;
-                color: #ECF0F1;
-                padding: 8px 16px;
-                margin-right: 2px;
-                border-top-left-radius: 4px;
-                border-top-right-radius: 4px;
-                min-width: 100px;
-            }
-            QTabBar::tab:selected {
-                background-color: #3498DB;
-                color: white;
-                font-weight: bold;
-            }
-            QTabBar::tab:hover {
-                background-color: #5DADE2;
-            }
-        """)
+        self.setStyleSheet(_TABS_QSS)
         
         # Crear la primera pestaña
         self.new_tab()
@@ -3371,12 +4443,19 @@ class TabbedCodeEditor(QTabWidget):
         tab_index = self.addTab(editor, tab_name)
         self.setTabToolTip(tab_index, tooltip)
         
-        # Almacenar datos de la pestaña
+        # Almacenar datos de la pestaña (addTab añade al final)
         tab_data = TabData(file_path, content, False)
-        self.tab_data[tab_index] = tab_data
-        
-        # Conectar señal de modificación del contenido
-        editor.textChanged.connect(lambda: self.on_content_changed(tab_index))
+        self.tab_data.insert(tab_index, tab_data)
+        if file_path:
+            self._path_to_editor[file_path] = editor
+        
+        # El documento lleva su propia marca de modificación: cambia solo en la primera
+        # edición y al deshacer hasta el estado guardado, sin comparar el texto en cada tecla.
+        # El índice se consulta al emitir porque cambia al cerrar o mover otras pestañas
+        editor.document().setModified(False)
+        editor.document().modificationChanged.connect(
+            lambda modified: self.on_content_changed(self.indexOf(editor), modified)
+        )
         
         # Hacer activa la nueva pestaña
         self.setCurrentIndex(tab_index)
@@ -3385,7 +4464,7 @@ class TabbedCodeEditor(QTabWidget):
     
     def close_tab(self, index):
         """Cierra una pestaña con confirmación si hay cambios sin guardar"""
-        if index in self.tab_data and self.tab_data[index].is_modified:
+        if 0 <= index < len(self.tab_data) and self.tab_data[index].is_modified:
             # Hay cambios sin guardar, pedir confirmación
             reply = QMessageBox.question(
                 self,
@@ -3409,18 +4488,11 @@ class TabbedCodeEditor(QTabWidget):
     
     def _close_tab(self, index):
         """Cierra la pestaña sin confirmación"""
-        # Eliminar datos de la pestaña
-        if index in self.tab_data:
-            del self.tab_data[index]
-        
-        # Actualizar índices de tabs restantes
-        new_tab_data = {}
-        for i, data in self.tab_data.items():
-            if i > index:
-                new_tab_data[i - 1] = data
-            elif i < index:
-                new_tab_data[i] = data
-        self.tab_data = new_tab_data
+        # Eliminar datos de la pestaña; las siguientes se desplazan solas
+        if 0 <= index < len(self.tab_data):
+            file_path = self.tab_data.pop(index).file_path
+            if file_path and self._path_to_editor.get(file_path) is self.widget(index):
+                del self._path_to_editor[file_path]
         
         # Eliminar la pestaña
         self.removeTab(index)
@@ -3429,31 +4501,35 @@ class TabbedCodeEditor(QTabWidget):
         if self.count() == 0:
             self.new_tab()
     
-    def on_content_changed(self, tab_index):
-        """Maneja cambios en el contenido de una pestaña"""
-        if tab_index not in self.tab_data:
+    def clear_tabs(self):
+        """Quita todas las pestañas sin confirmación y sin crear una nueva"""
+        self.tab_data.clear()
+        self._path_to_editor.clear()
+        self.clear()
+    
+    def on_tab_moved(self, from_index, to_index):
+        """Mantiene los datos alineados cuando el usuario arrastra una pestaña"""
+        self.tab_data.insert(to_index, self.tab_data.pop(from_index))
+    
+    def on_content_changed(self, tab_index, is_modified):
+        """Maneja cambios en el estado de modificación de una pestaña"""
+        if not 0 <= tab_index < len(self.tab_data):
             return
         
-        editor = self.widget(tab_index)
-        current_content = editor.toPlainText()
         tab_data = self.tab_data[tab_index]
-        
-        # Verificar si el contenido ha cambiado
-        is_modified = current_content != tab_data.original_content
-        
         if is_modified != tab_data.is_modified:
             tab_data.is_modified = is_modified
             self.update_tab_title(tab_index)
     
     def update_tab_title(self, tab_index):
         """Actualiza el título de la pestaña con indicador de modificación"""
-        if tab_index not in self.tab_data:
+        if not 0 <= tab_index < len(self.tab_data):
             return
         
         tab_data = self.tab_data[tab_index]
         
         if tab_data.file_path:
-            tab_name = os.path.basename(tab_data.file_path)
+            tab_name = tab_data.basename
         else:
             tab_name = f"Nuevo {tab_index + 1}"
         
@@ -3465,10 +4541,10 @@ class TabbedCodeEditor(QTabWidget):
     
     def on_tab_changed(self, index):
         """Maneja el cambio de pestaña activa"""
-        if index >= 0 and self.parent_editor:
+        if 0 <= index < len(self.tab_data) and self.parent_editor:
             # Actualizar la información en el editor principal
-            tab_data = self.tab_data.get(index)
-            if tab_data and hasattr(self.parent_editor, 'current_file_path'):
+            tab_data = self.tab_data[index]
+            if hasattr(self.parent_editor, 'current_file_path'):
                 self.parent_editor.current_file_path = tab_data.file_path
     
     def get_current_editor(self):
@@ -3481,28 +4557,25 @@ class TabbedCodeEditor(QTabWidget):
     def get_current_file_path(self):
         """Obtiene la ruta del archivo de la pestaña activa"""
         current_index = self.currentIndex()
-        if current_index in self.tab_data:
+        if 0 <= current_index < len(self.tab_data):
             return self.tab_data[current_index].file_path
         return None
     
     def load_file_in_tab(self, file_path):
         """Carga un archivo en una nueva pestaña o activa si ya está abierto"""
         # Verificar si el archivo ya está abierto
-        for index, tab_data in self.tab_data.items():
-            if tab_data.file_path == file_path:
-                self.setCurrentIndex(index)
-                return index
+        editor = self._path_to_editor.get(file_path)
+        if editor is not None:
+            index = self.indexOf(editor)  # El índice cambia al cerrar o mover pestañas
+            self.setCurrentIndex(index)
+            return index
         
         # Cargar archivo en nueva pestaña
         try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                content = file.read()
+            content = _read_source_file(file_path)
             
+            # TabData guarda el mismo texto como contenido original; no hay más copias
             tab_index, editor = self.new_tab(file_path, content)
-            
-            # Marcar como contenido original para detectar cambios
-            self.tab_data[tab_index].original_content = content
-            
             return tab_index
             
         except Exception as e:
@@ -3516,7 +4589,7 @@ class TabbedCodeEditor(QTabWidget):
     def save_current_tab(self):
         """Guarda el contenido de la pestaña actual"""
         current_index = self.currentIndex()
-        if current_index < 0:
+        if not 0 <= current_index < len(self.tab_data):
             return False
         
         editor = self.widget(current_index)
@@ -3533,28 +4606,33 @@ class TabbedCodeEditor(QTabWidget):
             if not file_path:
                 return False
             tab_data.file_path = file_path
+            self._path_to_editor[file_path] = editor
         
         # Guardar archivo
         try:
-            content = editor.toPlainText()
+            original = editor.toPlainText()
+            content = original
             
             # Aplicar formateo automático si está habilitado
             if hasattr(self, 'parent_editor') and self.parent_editor:
-                content = self.parent_editor._apply_auto_formatting(content)
+                content = self.parent_editor._apply_auto_formatting(original)
             
             with open(tab_data.file_path, 'w', encoding='utf-8') as file:
                 file.write(content)
             
-            # Actualizar contenido del editor si se formateó
-            if content != editor.toPlainText():
+            # Actualizar contenido del editor si se formateó, como una edición deshacible
+            if content != original:
                 cursor = editor.textCursor()
                 position = cursor.position()
-                editor.setPlainText(content)
+                cursor.beginEditBlock()
+                cursor.select(QTextCursor.SelectionType.Document)
+                cursor.insertText(content)
+                cursor.endEditBlock()
                 cursor.setPosition(min(position, len(content)))
                 editor.setTextCursor(cursor)
             
             # Actualizar estado
-            tab_data.original_content = content
+            editor.document().setModified(False)
             tab_data.is_modified = False
             self.update_tab_title(current_index)
             
@@ -3572,12 +4650,30 @@ class TabbedCodeEditor(QTabWidget):
             return False
 
 
+class SessionWriter(QThread):
+    """Hilo que serializa la sesión a JSON y la escribe sin bloquear la interfaz"""
+    
+    def __init__(self, session_file, session_data, parent=None):
+        super().__init__(parent)
+        self.session_file = session_file
+        self.session_data = session_data
+    
+    def run(self):
+        """Escribir la sesión de forma atómica (archivo temporal + os.replace)"""
+        try:
+            SessionManager.write_session_file(self.session_file, self.session_data)
+            print(f"💾 Sesión guardada: {len(self.session_data['open_files'])} archivos")
+        except Exception as e:
+            print(f"❌ Error guardando sesión: {e}")
+
+
 class SessionManager:
     """Gestor de sesiones para recordar archivos abiertos y estado del editor"""
     
     def __init__(self, editor_instance=None):
         self.editor = editor_instance
         self.session_file = None
+        self._writer = None  # Hilo de la última escritura en segundo plano
         self._setup_session_file()
     
     def _setup_session_file(self):
@@ -3590,14 +4686,60 @@ class SessionManager:
         project_dir = os.path.dirname(project_dir)  # Subir un nivel desde views/
         self.session_file = os.path.join(project_dir, AppConfig.SESSION_FILE_PATH)
     
-    def save_session(self):
-        """Guarda el estado actual de la sesión"""
+    @staticmethod
+    def write_session_file(session_file, session_data):
+        """Escribe la sesión sin que un lector pueda ver el archivo a medias"""
+        data_bytes = SessionManager._encode_session(session_data)
+        
+        # Temporal en el mismo directorio para que os.replace sea un renombrado atómico
+        tmp_path = None
+        try:
+            with tempfile.NamedTemporaryFile('wb', dir=os.path.dirname(session_file) or '.',
+                                             delete=False) as tf:
+                tmp_path = tf.name
+                tf.write(data_bytes)
+                # Asegurar que los datos están en disco antes de sustituir el archivo
+                tf.flush()
+                os.fsync(tf.fileno())
+            os.replace(tmp_path, session_file)
+        except Exception:
+            if tmp_path and os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+    
+    @staticmethod
+    def _encode_session(session_data):
+        """Serializa la sesión a bytes UTF-8 compactos, con orjson si está disponible"""
+        if orjson is not None:
+            return orjson.dumps(session_data)
+        import json
+        # Codificación compacta: sin espacios tras comas y dos puntos
+        return json.dumps(session_data, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    
+    @staticmethod
+    def read_session_file(session_file):
+        """Lee y decodifica el archivo de sesión, con orjson si está disponible"""
+        with open(session_file, 'rb') as f:
+            data = f.read()
+        if orjson is not None:
+            return orjson.loads(data)
+        import json
+        return json.loads(data)
+    
+    def wait_for_save(self):
+        """Espera a que termine la escritura de sesión en curso"""
+        if self._writer is not None:
+            self._writer.wait()
+            self._writer = None
+    
+    def save_session(self, background=True):
+        """Guarda el estado actual de la sesión; False si no se pudo (o no se pudo lanzar)"""
         try:
             from config import AppConfig
-            import json
+            import copy
             
             if not AppConfig.SESSION_MANAGEMENT_ENABLED:
-                return
+                return False
             
             session_data = {
                 'version': '1.0',
@@ -3622,21 +4764,26 @@ class SessionManager:
                         'index': i,
                         'title': tab_text,
                         'file_path': None,
-                        'content': '',
                         'cursor_position': 0,
                         'scroll_position': 0,
                         'is_modified': False
                     }
                     
                     # Obtener información del archivo si existe
-                    if hasattr(tab_widget, 'tab_data') and i in tab_widget.tab_data:
+                    if hasattr(tab_widget, 'tab_data') and i < len(tab_widget.tab_data):
                         tab_data = tab_widget.tab_data[i]
                         file_info['file_path'] = tab_data.file_path
                         file_info['is_modified'] = tab_data.is_modified
                     
-                    # Obtener contenido y posición del cursor
+                    # El contenido solo se guarda si no está en disco: pestañas sin guardar
+                    # o con cambios pendientes. El resto se vuelve a leer del archivo
+                    file_path = file_info['file_path']
                     if hasattr(editor_widget, 'toPlainText'):
-                        file_info['content'] = editor_widget.toPlainText()
+                        if file_info['is_modified'] or not file_path:
+                            file_info['content'] = editor_widget.toPlainText()
+                            if file_path and os.path.exists(file_path):
+                                # Para detectar si el archivo cambió en disco desde entonces
+                                file_info['mtime'] = os.path.getmtime(file_path)
                         
                         if hasattr(editor_widget, 'textCursor'):
                             cursor = editor_widget.textCursor()
@@ -3665,22 +4812,27 @@ class SessionManager:
             # Guardar tema actual
             if hasattr(self.editor, 'current_preferences'):
                 session_data['theme'] = self.editor.current_preferences.get('current_theme', AppConfig.DEFAULT_THEME)
-                session_data['preferences'] = self.editor.current_preferences.copy()
-            
-            # Escribir archivo de sesión
-            with open(self.session_file, 'w', encoding='utf-8') as f:
-                json.dump(session_data, f, indent=2, ensure_ascii=False)
-            
-            print(f"💾 Sesión guardada: {len(session_data['open_files'])} archivos")
+                # Copia profunda: el hilo de escritura no debe ver cambios posteriores
+                session_data['preferences'] = copy.deepcopy(self.editor.current_preferences)
+            
+            # Escribir archivo de sesión; el contenido ya está copiado, el JSON se genera en otro hilo
+            self.wait_for_save()  # Nunca dos escrituras a la vez sobre el temporal
+            if background:
+                self._writer = SessionWriter(self.session_file, session_data)
+                self._writer.start()
+            else:
+                self.write_session_file(self.session_file, session_data)
+                print(f"💾 Sesión guardada: {len(session_data['open_files'])} archivos")
+            return True
             
         except Exception as e:
             print(f"❌ Error guardando sesión: {e}")
+            return False
     
     def restore_session(self):
         """Restaura la sesión guardada"""
         try:
             from config import AppConfig
-            import json
             import os
             
             if not AppConfig.SESSION_MANAGEMENT_ENABLED or not AppConfig.SESSION_RESTORE_ON_STARTUP:
@@ -3691,55 +4843,70 @@ class SessionManager:
                 return False
             
             # Leer archivo de sesión
-            with open(self.session_file, 'r', encoding='utf-8') as f:
-                session_data = json.load(f)
+            session_data = self.read_session_file(self.session_file)
             
             print(f"🔄 Restaurando sesión: {len(session_data.get('open_files', []))} archivos")
             
             # Restaurar archivos abiertos
             open_files = session_data.get('open_files', [])
             if open_files and hasattr(self.editor, 'tab_widget'):
-                # Limpiar pestañas existentes (excepto la primera vacía)
+                # Quitar las pestañas existentes (y sus datos) antes de restaurar
                 tab_widget = self.editor.tab_widget
-                while tab_widget.count() > 1:
-                    tab_widget.removeTab(1)
-                
-                # Si hay archivos para restaurar, quitar la pestaña vacía inicial
-                if open_files:
-                    if tab_widget.count() > 0:
-                        tab_widget.removeTab(0)
+                tab_widget.clear_tabs()
                 
-                # Restaurar cada archivo
+                # Restaurar cada archivo; el scroll se aplica después, en una sola pasada
+                pending_scroll = []
                 for file_info in open_files:
                     file_path = file_info.get('file_path')
-                    content = file_info.get('content', '')
+                    content = file_info.get('content')  # Solo se guarda si no está en disco
                     cursor_pos = file_info.get('cursor_position', 0)
                     scroll_pos = file_info.get('scroll_position', 0)
                     
+                    # Cambios sin guardar de un archivo que no se ha tocado en disco desde entonces
+                    has_pending_changes = (
+                        file_path and 'content' in file_info and file_info.get('is_modified')
+                        and (not os.path.exists(file_path)
+                             or os.path.getmtime(file_path) == file_info.get('mtime'))
+                    )
+                    
                     # Crear nueva pestaña
-                    if file_path and os.path.exists(file_path):
-                        # Archivo existe, abrirlo
+                    if has_pending_changes:
+                        tab_index, editor = tab_widget.new_tab(file_path, content)
+                        editor.document().setModified(True)
+                    elif file_path:
                         try:
-                            with open(file_path, 'r', encoding='utf-8') as f:
-                                file_content = f.read()
-                            tab_index, editor = tab_widget.new_tab(file_path, file_content)
+                            file_content = _read_source_file(file_path)
                         except Exception as e:
+                            if content is None:
+                                # Sin copia en la sesión: una pestaña vacía ligada a la ruta
+                                # acabaría truncando el archivo al guardar
+                                print(f"⚠️ Se omite {file_path}: {e}")
+                                continue
                             print(f"⚠️ Error leyendo archivo {file_path}: {e}")
                             # Usar contenido de la sesión como fallback
-                            tab_index, editor = tab_widget.new_tab(file_path, content)
+                            file_content = content
+                        tab_index, editor = tab_widget.new_tab(file_path, file_content)
                     else:
-                        # Archivo no existe o es nuevo, usar contenido de sesión
-                        tab_index, editor = tab_widget.new_tab(file_path, content)
+                        # Pestaña nueva sin archivo, usar contenido de sesión
+                        tab_index, editor = tab_widget.new_tab(None, content or '')
                     
                     # Restaurar posición del cursor y scroll
                     if hasattr(editor, 'textCursor'):
                         cursor = editor.textCursor()
-                        cursor.setPosition(min(cursor_pos, len(editor.toPlainText())))
+                        # characterCount incluye el separador final del documento
+                        doc_len = editor.document().characterCount() - 1
+                        cursor.setPosition(min(cursor_pos, max(0, doc_len)))
                         editor.setTextCursor(cursor)
                     
                     if hasattr(editor, 'verticalScrollBar'):
-                        scroll_bar = editor.verticalScrollBar()
-                        QTimer.singleShot(100, lambda pos=scroll_pos: scroll_bar.setValue(pos))
+                        pending_scroll.append((editor, scroll_pos))
+                
+                if pending_scroll:
+                    QTimer.singleShot(100, lambda: self._apply_scroll_positions(pending_scroll))
+                
+                # Si no se pudo restaurar ningún archivo, dejar una pestaña vacía
+                if tab_widget.count() == 0:
+                    tab_widget.new_tab()
                 
                 # Restaurar pestaña activa
                 active_index = session_data.get('active_tab_index', 0)
@@ -3768,6 +4935,11 @@ class SessionManager:
             print(f"❌ Error restaurando sesión: {e}")
             return False
     
+    def _apply_scroll_positions(self, pending_scroll):
+        """Aplica las posiciones de scroll restauradas una vez maquetadas las pestañas"""
+        for editor, scroll_pos in pending_scroll:
+            editor.verticalScrollBar().setValue(scroll_pos)
+    
     def _restore_window_state(self, window_state):
         """Restaura el estado de la ventana"""
         try:
@@ -3811,27 +4983,29 @@ class SessionManager:
         """Obtiene la lista de archivos recientes"""
         try:
             from config import AppConfig
-            import json
             import os
             
             if not os.path.exists(self.session_file):
                 return []
             
-            with open(self.session_file, 'r', encoding='utf-8') as f:
-                session_data = json.load(f)
+            session_data = self.read_session_file(self.session_file)
             
+            max_recent = AppConfig.SESSION_MAX_RECENT_FILES
+            timestamp = session_data.get('timestamp', '')
             recent_files = []
             for file_info in session_data.get('open_files', []):
+                # Limitar número de archivos recientes sin comprobar el resto en disco
+                if len(recent_files) >= max_recent:
+                    break
                 file_path = file_info.get('file_path')
                 if file_path and os.path.exists(file_path):
                     recent_files.append({
                         'path': file_path,
                         'name': os.path.basename(file_path),
-                        'timestamp': session_data.get('timestamp', '')
+                        'timestamp': timestamp
                     })
             
-            # Limitar número de archivos recientes
-            return recent_files[:AppConfig.SESSION_MAX_RECENT_FILES]
+            return recent_files
             
         except Exception as e:
             print(f"❌ Error obteniendo archivos recientes: {e}")
@@ -3843,13 +5017,31 @@ class SessionManager:
         return datetime.now().isoformat()
 
 
+def _terminal_format(color):
+    """Crea el formato de carácter para un color de texto del terminal"""
+    text_format = QTextCharFormat()
+    text_format.setForeground(QColor(color))
+    return text_format
+
+
+# Formatos de texto del terminal integrado, creados una sola vez
+_TERMINAL_OK_FORMAT = _terminal_format("#00FF00")
+_TERMINAL_ERROR_FORMAT = _terminal_format("#FF0000")
+_TERMINAL_WARNING_FORMAT = _terminal_format("#FF8800")
+_TERMINAL_INFO_FORMAT = _terminal_format("#FFFF00")
+_TERMINAL_DIM_FORMAT = _terminal_format("#CCCCCC")
+_TERMINAL_WELCOME_FORMAT = _terminal_format("#00FFFF")
+_TERMINAL_COMMAND_FORMAT = _terminal_format("#FFFFFF")
+
+
 class IntegratedTerminal(QWidget):
     """Terminal integrado con REPL de Python y comandos del sistema"""
     
     def __init__(self, parent=None):
         super().__init__(parent)
         self.parent_editor = parent
-        self.history = []
+        # Historial acotado: los comandos más antiguos se descartan solos
+        self.history = deque(maxlen=AppConfig.TERMINAL_HISTORY_SIZE)
         self.history_index = -1
         self.current_process = None
         self.python_repl_active = False
@@ -3892,6 +5084,8 @@ class IntegratedTerminal(QWidget):
         self.terminal_output = QTextEdit()
         self.terminal_output.setReadOnly(True)
         self.terminal_output.setFont(QFont("Consolas", 11))
+        # Limitar la salida acumulada: Qt descarta solo las líneas más antiguas
+        self.terminal_output.document().setMaximumBlockCount(AppConfig.TERMINAL_MAX_LINES)
         layout.addWidget(self.terminal_output)
         
         # Entrada de comandos
@@ -4005,9 +5199,7 @@ class IntegratedTerminal(QWidget):
 ¡Comienza escribiendo un comando!
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 """
-        self.terminal_output.setTextColor(QColor("#00FFFF"))
-        self.terminal_output.append(welcome_text)
-        self.terminal_output.setTextColor(QColor("#00FF00"))
+        self._emit(welcome_text, _TERMINAL_WELCOME_FORMAT)
         
     def _on_mode_changed(self, mode_text):
         """Maneja el cambio de modo del terminal"""
@@ -4031,33 +5223,31 @@ class IntegratedTerminal(QWidget):
             import sys
             
             self.python_repl_active = True
-            self.terminal_output.setTextColor(QColor("#FFFF00"))
-            self.terminal_output.append("\n🐍 Modo Python REPL activado")
-            self.terminal_output.append("Python " + sys.version.split()[0])
-            self.terminal_output.append("Escribe 'exit()' para salir del REPL")
-            self.terminal_output.setTextColor(QColor("#00FF00"))
+            self._emit(
+                f"\n🐍 Modo Python REPL activado\n"
+                f"Python {sys.version.split()[0]}\n"
+                f"Escribe 'exit()' para salir del REPL",
+                _TERMINAL_INFO_FORMAT
+            )
             
         except Exception as e:
-            self.terminal_output.setTextColor(QColor("#FF0000"))
-            self.terminal_output.append(f"❌ Error al iniciar Python REPL: {e}")
-            self.terminal_output.setTextColor(QColor("#00FF00"))
+            self._emit(f"❌ Error al iniciar Python REPL: {e}", _TERMINAL_ERROR_FORMAT)
     
     def _setup_pip_mode(self):
         """Configura el modo pip"""
         self.python_repl_active = False
             
-        self.terminal_output.setTextColor(QColor("#FFFF00"))
-        self.terminal_output.append("\n📦 Modo Pip activado")
-        self.terminal_output.append("Ejemplos: install requests, list, show requests, uninstall requests")
-        self.terminal_output.setTextColor(QColor("#00FF00"))
+        self._emit(
+            "\n📦 Modo Pip activado\n"
+            "Ejemplos: install requests, list, show requests, uninstall requests",
+            _TERMINAL_INFO_FORMAT
+        )
     
     def _setup_system_mode(self):
         """Configura el modo sistema"""
         self.python_repl_active = False
             
-        self.terminal_output.setTextColor(QColor("#FFFF00"))
-        self.terminal_output.append("\n🖥️ Modo Sistema activado")
-        self.terminal_output.setTextColor(QColor("#00FF00"))
+        self._emit("\n🖥️ Modo Sistema activado", _TERMINAL_INFO_FORMAT)
     
     def execute_command(self):
         """Ejecuta el comando ingresado"""
@@ -4073,9 +5263,7 @@ class IntegratedTerminal(QWidget):
         current_mode = self.mode_combo.currentText()
         prompt = self.prompt_label.text()
         
-        self.terminal_output.setTextColor(QColor("#FFFFFF"))
-        self.terminal_output.append(f"{prompt} {command}")
-        self.terminal_output.setTextColor(QColor("#00FF00"))
+        self._emit(f"{prompt} {command}", _TERMINAL_COMMAND_FORMAT)
         
         # Ejecutar según el modo
         if "Python REPL" in current_mode:
@@ -4097,15 +5285,12 @@ class IntegratedTerminal(QWidget):
         """Ejecuta comando en Python REPL de forma segura"""
         try:
             if command.lower() in ['exit()', 'quit()', 'exit', 'quit']:
-                self.terminal_output.setTextColor(QColor("#FFFF00"))
-                self.terminal_output.append("🔄 Saliendo del Python REPL...")
+                self._emit("🔄 Saliendo del Python REPL...", _TERMINAL_INFO_FORMAT)
                 self.mode_combo.setCurrentText("🖥️ Sistema")
                 return
             
             # Mostrar comando ejecutándose
-            self.terminal_output.setTextColor(QColor("#CCCCCC"))
-            self.terminal_output.append(f">>> {command[:100]}{'...' if len(command) > 100 else ''}")
-            self.terminal_output.setTextColor(QColor("#00FF00"))
+            self._emit(f">>> {command[:100]}{'...' if len(command) > 100 else ''}", _TERMINAL_DIM_FORMAT)
             
             # Ejecutar código Python de forma segura y síncrona (para evitar problemas de hilos)
             import io
@@ -4127,33 +5312,27 @@ class IntegratedTerminal(QWidget):
                     with warnings.catch_warnings():
                         warnings.simplefilter("ignore")
                         
-                        # Dividir código en líneas para mejor manejo
-                        lines = command.strip().split('\n')
-                        
-                        # Intentar como expresión simple primero
-                        if len(lines) == 1 and not any(keyword in command for keyword in ['=', 'import', 'def', 'class', 'if', 'for', 'while', 'with', 'try']):
-                            try:
-                                result = eval(command)
-                                if result is not None:
-                                    print(result)
-                            except:
-                                # Si falla como expresión, ejecutar como código
-                                exec(command)
+                        # Compilar como expresión para mostrar su valor; si no lo es,
+                        # ejecutar como sentencias. Se compila una sola vez y un error en
+                        # tiempo de ejecución ya no provoca una segunda ejecución
+                        try:
+                            code_obj = compile(command, '<repl>', 'eval')
+                        except SyntaxError:
+                            exec(compile(command, '<repl>', 'exec'))
                         else:
-                            # Ejecutar como código completo
-                            exec(command)
+                            result = eval(code_obj)
+                            if result is not None:
+                                print(result)
                 
                 # Mostrar resultado
                 stdout_output = stdout_capture.getvalue()
                 stderr_output = stderr_capture.getvalue()
                 
                 if stdout_output:
-                    self.terminal_output.append(stdout_output.strip())
+                    self._emit(stdout_output.strip())
                     
                 if stderr_output:
-                    self.terminal_output.setTextColor(QColor("#FF8800"))
-                    self.terminal_output.append(stderr_output.strip())
-                    self.terminal_output.setTextColor(QColor("#00FF00"))
+                    self._emit(stderr_output.strip(), _TERMINAL_WARNING_FORMAT)
                     
             finally:
                 sys.stdout = old_stdout
@@ -4165,101 +5344,125 @@ class IntegratedTerminal(QWidget):
             self.terminal_output.setTextCursor(cursor)
                             
         except Exception as e:
-            self.terminal_output.setTextColor(QColor("#FF0000"))
-            self.terminal_output.append(f"❌ Error en Python REPL: {e}")
-            self.terminal_output.setTextColor(QColor("#00FF00"))
+            self._emit(f"❌ Error en Python REPL: {e}", _TERMINAL_ERROR_FORMAT)
     
     def _execute_pip_command(self, command):
         """Ejecuta comando pip"""
-        try:
-            import subprocess
-            import sys
-            
-            # Construir comando pip completo
-            pip_cmd = [sys.executable, "-m", "pip"] + command.split()
-            
-            self.stop_btn.setEnabled(True)
-            self.terminal_output.setTextColor(QColor("#FFFF00"))
-            self.terminal_output.append(f"⚡ Ejecutando: pip {command}")
-            self.terminal_output.setTextColor(QColor("#00FF00"))
-            
-            # Ejecutar comando pip
-            process = subprocess.run(
-                pip_cmd,
-                capture_output=True,
-                text=True,
-                timeout=60  # Timeout de 60 segundos
-            )
-            
-            # Mostrar salida
-            if process.stdout:
-                self.terminal_output.append(process.stdout.strip())
-                
-            if process.stderr:
-                self.terminal_output.setTextColor(QColor("#FF8800"))
-                self.terminal_output.append(process.stderr.strip())
-                self.terminal_output.setTextColor(QColor("#00FF00"))
-            
-            if process.returncode == 0:
-                self.terminal_output.setTextColor(QColor("#00FF00"))
-                self.terminal_output.append("✅ Comando completado exitosamente")
-                self.terminal_output.setTextColor(QColor("#00FF00"))
-            else:
-                self.terminal_output.setTextColor(QColor("#FF0000"))
-                self.terminal_output.append(f"❌ Comando falló con código: {process.returncode}")
-                self.terminal_output.setTextColor(QColor("#00FF00"))
-                
-        except subprocess.TimeoutExpired:
-            self.terminal_output.setTextColor(QColor("#FF8800"))
-            self.terminal_output.append("⏰ Comando pip excedió el tiempo límite")
-            self.terminal_output.setTextColor(QColor("#00FF00"))
-        except Exception as e:
-            self.terminal_output.setTextColor(QColor("#FF0000"))
-            self.terminal_output.append(f"❌ Error ejecutando pip: {e}")
-            self.terminal_output.setTextColor(QColor("#00FF00"))
-        finally:
-            self.stop_btn.setEnabled(False)
+        import sys
+        
+        self._emit(f"⚡ Ejecutando: pip {command}", _TERMINAL_INFO_FORMAT)
+        
+        self._start_process(sys.executable, ["-m", "pip"] + command.split(), report_exit_code=True)
     
     def _execute_system_command(self, command):
         """Ejecuta comando del sistema"""
-        try:
-            import subprocess
-            import os
-            
-            self.stop_btn.setEnabled(True)
-            self.terminal_output.setTextColor(QColor("#FFFF00"))
-            self.terminal_output.append(f"⚡ Ejecutando: {command}")
-            self.terminal_output.setTextColor(QColor("#00FF00"))
-            
-            # Ejecutar comando del sistema
-            process = subprocess.run(
-                command,
-                shell=True,
-                capture_output=True,
-                text=True,
-                cwd=os.getcwd(),
-                timeout=30  # Timeout de 30 segundos
-            )
-            
-            # Mostrar salida
-            if process.stdout:
-                self.terminal_output.append(process.stdout.strip())
-                
-            if process.stderr:
-                self.terminal_output.setTextColor(QColor("#FF8800"))
-                self.terminal_output.append(process.stderr.strip())
-                self.terminal_output.setTextColor(QColor("#00FF00"))
-                
-        except subprocess.TimeoutExpired:
-            self.terminal_output.setTextColor(QColor("#FF8800"))
-            self.terminal_output.append("⏰ Comando excedió el tiempo límite")
-            self.terminal_output.setTextColor(QColor("#00FF00"))
-        except Exception as e:
-            self.terminal_output.setTextColor(QColor("#FF0000"))
-            self.terminal_output.append(f"❌ Error ejecutando comando: {e}")
-            self.terminal_output.setTextColor(QColor("#00FF00"))
-        finally:
-            self.stop_btn.setEnabled(False)
+        self._emit(f"⚡ Ejecutando: {command}", _TERMINAL_INFO_FORMAT)
+        
+        # El comando pasa por el shell del sistema, como con subprocess(shell=True)
+        if os.name == 'nt':
+            self._start_process("cmd", ["/c", command])
+        else:
+            self._start_process("/bin/sh", ["-c", command])
+    
+    def _start_process(self, program, arguments, report_exit_code=False):
+        """Lanza un proceso externo sin bloquear la interfaz, mostrando su salida según llega"""
+        if self.current_process is not None:
+            self._emit("⚠️ Ya hay un proceso en ejecución; deténgalo antes de lanzar otro", _TERMINAL_WARNING_FORMAT)
+            return
+        
+        import codecs
+        
+        process = QProcess(self)
+        process.setWorkingDirectory(os.getcwd())
+        process.readyReadStandardOutput.connect(self._read_process_output)
+        process.readyReadStandardError.connect(self._read_process_error)
+        process.errorOccurred.connect(self._on_process_error)
+        process.finished.connect(self._on_process_finished)
+        
+        # Decodificadores incrementales: un carácter UTF-8 puede quedar partido entre lecturas
+        self._stdout_decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self._stderr_decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        # La salida empieza en una línea nueva y el último salto se retiene hasta saber si sigue algo
+        self._pending_newline = "\n"
+        self._report_exit_code = report_exit_code
+        
+        self.current_process = process
+        self.stop_btn.setEnabled(True)
+        process.start(program, arguments)
+    
+    def _read_process_output(self):
+        """Muestra la salida estándar disponible del proceso en curso"""
+        if self.current_process is not None:
+            data = self.current_process.readAllStandardOutput().data()
+            self._insert_process_text(self._stdout_decoder.decode(data), _TERMINAL_OK_FORMAT)
+    
+    def _read_process_error(self):
+        """Muestra la salida de error disponible del proceso en curso"""
+        if self.current_process is not None:
+            data = self.current_process.readAllStandardError().data()
+            self._insert_process_text(self._stderr_decoder.decode(data), _TERMINAL_WARNING_FORMAT)
+    
+    def _insert_process_text(self, text, text_format):
+        """Añade un fragmento de salida del proceso al final del terminal"""
+        text = text.replace('\r\n', '\n')
+        if not text:
+            return
+        
+        text = self._pending_newline + text
+        if text.endswith('\n'):
+            text = text[:-1]
+            self._pending_newline = "\n"
+        else:
+            self._pending_newline = ""
+        
+        self._insert_at_end(text, text_format)
+    
+    def _emit(self, text, text_format=_TERMINAL_OK_FORMAT):
+        """Escribe un mensaje en una línea nueva al final del terminal"""
+        if not self.terminal_output.document().isEmpty():
+            text = "\n" + text
+        self._insert_at_end(text, text_format)
+    
+    def _insert_at_end(self, text, text_format):
+        """Inserta texto plano al final del terminal con el formato dado y lo mantiene visible"""
+        cursor = self.terminal_output.textCursor()
+        cursor.movePosition(cursor.MoveOperation.End)
+        cursor.insertText(text, text_format)
+        self.terminal_output.setTextCursor(cursor)
+    
+    def _on_process_error(self, error):
+        """Informa de un proceso que no se pudo iniciar"""
+        # El resto de errores van seguidos de finished, que hace la limpieza
+        if error == QProcess.ProcessError.FailedToStart:
+            self._emit(f"❌ Error ejecutando comando: {self.current_process.errorString()}", _TERMINAL_ERROR_FORMAT)
+            self._finish_process()
+    
+    def _on_process_finished(self, exit_code, exit_status):
+        """Vacía la salida pendiente e informa del resultado del proceso"""
+        self._insert_process_text(self._stdout_decoder.decode(b'', final=True), _TERMINAL_OK_FORMAT)
+        self._insert_process_text(self._stderr_decoder.decode(b'', final=True), _TERMINAL_WARNING_FORMAT)
+        
+        if exit_status == QProcess.ExitStatus.CrashExit:
+            self._emit("⏹️ Proceso detenido", _TERMINAL_INFO_FORMAT)
+        elif self._report_exit_code:
+            if exit_code == 0:
+                self._emit("✅ Comando completado exitosamente")
+            else:
+                self._emit(f"❌ Comando falló con código: {exit_code}", _TERMINAL_ERROR_FORMAT)
+        
+        self._finish_process()
+    
+    def _finish_process(self):
+        """Libera el proceso en curso y deja el terminal listo para otro comando"""
+        if self.current_process is not None:
+            self.current_process.deleteLater()
+            self.current_process = None
+        self.stop_btn.setEnabled(False)
+        
+        # Auto-scroll al final
+        cursor = self.terminal_output.textCursor()
+        cursor.movePosition(cursor.MoveOperation.End)
+        self.terminal_output.setTextCursor(cursor)
     
     def clear_terminal(self):
         """Limpia el contenido del terminal"""
@@ -4268,13 +5471,9 @@ class IntegratedTerminal(QWidget):
     
     def stop_current_process(self):
         """Detiene el proceso actual"""
-        if self.current_process:
-            self.current_process.terminate()
-            self.current_process = None
-            self.terminal_output.setTextColor(QColor("#FFFF00"))
-            self.terminal_output.append("⏹️ Proceso detenido")
-            self.terminal_output.setTextColor(QColor("#00FF00"))
-            self.stop_btn.setEnabled(False)
+        # El aviso y la limpieza los hace _on_process_finished
+        if self.current_process is not None:
+            self.current_process.kill()
     
     def eventFilter(self, obj, event):
         """Filtro de eventos para el historial de comandos"""
@@ -4315,18 +5514,14 @@ class IntegratedTerminal(QWidget):
             self.mode_combo.setCurrentText("🐍 Python REPL")
         
         # Mostrar el código que se va a ejecutar
-        self.terminal_output.setTextColor(QColor("#FFFF00"))
-        self.terminal_output.append("📝 Ejecutando código desde el editor:")
-        self.terminal_output.setTextColor(QColor("#CCCCCC"))
+        self._emit("📝 Ejecutando código desde el editor:", _TERMINAL_INFO_FORMAT)
         
-        # Mostrar el código con numeración de líneas
-        lines = code.split('\n')
-        for i, line in enumerate(lines, 1):
-            self.terminal_output.append(f"{i:3d}: {line}")
+        # Mostrar el código con numeración de líneas, insertado de una vez en lugar de una
+        # llamada por línea
+        numbered = "\n".join(f"{i:3d}: {line}" for i, line in enumerate(code.split('\n'), 1))
+        self._emit(numbered, _TERMINAL_DIM_FORMAT)
         
-        self.terminal_output.setTextColor(QColor("#FFFF00"))
-        self.terminal_output.append("━━━ Salida del código ━━━")
-        self.terminal_output.setTextColor(QColor("#00FF00"))
+        self._emit("━━━ Salida del código ━━━", _TERMINAL_INFO_FORMAT)
         
         # Ejecutar el código
         self._execute_python_command(code)
@@ -4660,9 +5855,9 @@ La salida de ejecución de código aparecerá aquí."""
             if hasattr(self, 'input_text') and hasattr(self.input_text, 'preferences_settings'):
                 self._save_settings(self.input_text.preferences_settings)
             
-            # Guardar sesión antes de cerrar
+            # Guardar sesión antes de cerrar (en este hilo: la aplicación va a terminar)
             if hasattr(self, 'session_manager'):
-                self.session_manager.save_session()
+                self.session_manager.save_session(background=False)
             
             # Limpiar terminal integrado y procesos
             if hasattr(self, 'integrated_terminal'):
@@ -4674,6 +5869,10 @@ La salida de ejecución de código aparecerá aquí."""
                 except:
                     pass
             
+            # Esperar los listados del explorador que sigan en curso
+            if hasattr(self, 'file_explorer'):
+                self.file_explorer.shutdown_directory_scans()
+            
             # Ocultar el icono de la bandeja si existe
             if self.tray_icon:
                 self.tray_icon.hide()
@@ -5210,7 +6409,7 @@ La salida de ejecución de código aparecerá aquí."""
     def has_unsaved_changes(self):
         """Verifica si hay cambios sin guardar usando el sistema de pestañas"""
         # Verificar si alguna pestaña tiene cambios sin guardar
-        for tab_data in self.tabbed_editor.tab_data.values():
+        for tab_data in self.tabbed_editor.tab_data:
             if tab_data.is_modified:
                 return True
         return False
@@ -5232,7 +6431,17 @@ La salida de ejecución de código aparecerá aquí."""
         preferences_dialog.parent_editor = self  # Establecer referencia al editor
         if preferences_dialog.exec() == QDialog.DialogCode.Accepted:
             new_settings = preferences_dialog.get_new_settings()
-            self.apply_preferences(new_settings)  # Ya no pasamos False, que guardará automáticamente
+            # Se compara con lo aplicado (puede haber una vista previa) antes que con lo guardado
+            if preferences_dialog.has_unapplied_changes():
+                self.apply_preferences(new_settings)  # Aplica y guarda
+            elif new_settings == current_settings:
+                # Aceptar sin cambios no vuelve a aplicar ni guardar nada
+                return
+            else:
+                # La vista previa ya aplicó estos valores: solo falta guardarlos
+                self.current_preferences = new_settings.copy()
+                self._save_settings(new_settings)
+                self.show_message("Preferencias", "✅ Preferencias aplicadas y guardadas correctamente", "info")
     
     def _get_current_settings(self):
         """Obtiene las configuraciones actuales del editor"""
@@ -5552,7 +6761,7 @@ La salida de ejecución de código aparecerá aquí."""
             if hasattr(self, 'tab_widget'):
                 current_index = self.tab_widget.currentIndex()
                 if hasattr(self, 'tabbed_editor') and current_index >= 0:
-                    if current_index in self.tabbed_editor.tab_data:
+                    if current_index < len(self.tabbed_editor.tab_data):
                         self.tabbed_editor.tab_data[current_index].is_modified = True
                         self.tabbed_editor.update_tab_title(current_index)
             
@@ -5665,8 +6874,11 @@ La salida de ejecución de código aparecerá aquí."""
         """Guarda la sesión manualmente desde el menú"""
         try:
             if hasattr(self, 'session_manager'):
-                self.session_manager.save_session()
-                self.show_message("Sesión", "💾 Sesión guardada exitosamente", "info")
+                # En este hilo: el mensaje debe reflejar si la escritura terminó bien
+                if self.session_manager.save_session(background=False):
+                    self.show_message("Sesión", "💾 Sesión guardada exitosamente", "info")
+                else:
+                    self.show_message("Error", "❌ No se pudo guardar la sesión", "error")
             else:
                 self.show_message("Error", "❌ Gestor de sesiones no disponible", "error")
         except Exception as e: